@@ -1,10 +1,14 @@
 import argparse
+import json
 import logging
 import os
+import sqlite3
 import sys
 import zipfile
 from . import __version__ as current_version
 from .lib import extent
+from .lib.cache import DoiCache, DownloadStore, ResultCache
+from .lib.scratch import ScratchArea
 from .lib import helpfunctions as hf
 
 logging.basicConfig(level=logging.WARNING)
@@ -35,6 +39,7 @@ Supported formats:
 - GPS Exchange Format (.gpx)
 - Geography Markup Language (.gml)
 - Keyhole Markup Language (.kml)
+- Gridded datasets with coordinate variables (.nc, .h5, Zarr stores)
 
 '''
 
@@ -120,6 +125,140 @@ def get_arg_parser():
         help='extract temporal extent (%%Y-%%m-%%d)'
     )
 
+    parser.add_argument(
+        '--workers',
+        action='store',
+        type=int,
+        default=None,
+        help='number of parallel processes extracting the files of folders, ZIP files and repositories',
+    )
+
+    parser.add_argument(
+        '--scratch-dir',
+        action='store',
+        default=None,
+        help='directory archives are extracted to when GDAL cannot read them directly (default: system temporary '
+             'directory)',
+    )
+
+    parser.add_argument(
+        '--disk-quota',
+        action='store',
+        type=int,
+        default=None,
+        help='extract at most this many bytes of archives at once, archives and files beyond are left out and '
+             'listed in skipped_files; the uncompressed size is checked before extracting, so archives GDAL '
+             'cannot read that do not declare it (e.g. 7z, RAR) are left out as well',
+    )
+
+    parser.add_argument(
+        '--download-workers',
+        action='store',
+        type=int,
+        default=None,
+        help='number of files of a repository record downloaded concurrently (default: 4)',
+    )
+
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        default=False,
+        help='extract every file of a repository as soon as it is downloaded and delete it afterwards',
+    )
+
+    parser.add_argument(
+        '--remote',
+        action='store_true',
+        default=False,
+        help='read GeoTIFF, GeoPackage, JPEG 2000 and FlatGeobuf files of a repository with HTTP range requests '
+             'instead of downloading them',
+    )
+
+    parser.add_argument(
+        '--download-store',
+        action='store',
+        default=None,
+        help='directory keeping the files downloaded from repositories, so that interrupted downloads are resumed '
+             'and files are not downloaded again',
+    )
+
+    parser.add_argument(
+        '--metadata-first',
+        action='store_true',
+        default=False,
+        help='return the extent a repository record declares in its metadata, without downloading its files, '
+             'if the metadata has all requested extents',
+    )
+
+    parser.add_argument(
+        '--metadata-only-above',
+        action='store',
+        type=int,
+        default=None,
+        help='size in bytes of repository records above which only the extent declared in their metadata is returned',
+    )
+
+    parser.add_argument(
+        '--skip-unsupported',
+        action='store_true',
+        default=False,
+        help='do not download files of repositories whose format geoextent does not support',
+    )
+
+    parser.add_argument(
+        '--max-file-size',
+        action='store',
+        type=int,
+        default=None,
+        help='do not download files of repositories larger than this many bytes',
+    )
+
+    parser.add_argument(
+        '--max-record-size',
+        action='store',
+        type=int,
+        default=None,
+        help='download at most this many bytes of a repository record',
+    )
+
+    parser.add_argument(
+        '--repositories',
+        action='store_true',
+        default=False,
+        help='the input is a text file with one repository DOI or link per line, the result of every record is '
+             'printed as newline-delimited JSON as soon as it is extracted',
+    )
+
+    parser.add_argument(
+        '--record-workers',
+        action='store',
+        type=int,
+        default=4,
+        help='number of repository records extracted concurrently with --repositories (default: 4)',
+    )
+
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        default=False,
+        help='print the result of every file of folders and ZIP files as soon as it is extracted, '
+             'as newline-delimited JSON',
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        action='store',
+        default=None,
+        help='directory of the cache of extraction results of unchanged files (default: $XDG_CACHE_HOME/geoextent)',
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        default=False,
+        help='do not read or write the cache of extraction results and resolved DOIs',
+    )
+
     parser.add_argument(
         'files',
         action=readable_file_or_dir,
@@ -184,6 +323,9 @@ def main():
     is_file = os.path.isfile(os.path.join(os.getcwd(), files))
     is_zipfile = zipfile.is_zipfile(os.path.join(os.getcwd(), files))
     is_directory = os.path.isdir(os.path.join(os.getcwd(), files))
+    # a Zarr store is a folder extracted as one dataset
+    if is_directory and hf.is_zarr_store(os.path.join(os.getcwd(), files)):
+        is_file, is_directory = True, False
 
     # Identify URL
     is_url = hf.https_regexp.match(files) is not None
@@ -197,21 +339,87 @@ def main():
     except ValueError as e:
         raise ValueError(e)
 
+    cache = None
+    doi_cache = None
+    if not args['no_cache']:
+        try:
+            cache = ResultCache(args['cache_dir'])
+            if is_url or args['repositories']:
+                doi_cache = DoiCache(args['cache_dir'])
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Cache of extraction results disabled, it could not be opened: {}".format(e))
+
+    download_store = None
+    if (is_url or args['repositories']) and args['download_store'] is not None:
+        download_store = DownloadStore(args['download_store'])
+
+    repository_options = {
+        'workers': args['workers'],
+        'download_workers': args['download_workers'],
+        'doi_cache': doi_cache,
+        'pipeline': args['pipeline'],
+        'remote': args['remote'],
+        'download_store': download_store,
+        'metadata_first': args['metadata_first'],
+        'metadata_only_above': args['metadata_only_above'],
+        'skip_unsupported': args['skip_unsupported'],
+        'max_file_size': args['max_file_size'],
+        'max_record_size': args['max_record_size'],
+    }
+
+    if args['repositories']:
+        with open(files) as f:
+            identifiers = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        try:
+            for record in extent.from_repositories(identifiers, bbox=args['bounding_box'], tbox=args['time_box'],
+                                                   details=args['details'], record_workers=args['record_workers'],
+                                                   **repository_options):
+                print(json.dumps(record), flush=True)
+        except Exception as e:
+            if logger.getEffectiveLevel() >= logging.DEBUG:
+                logger.exception(e)
+            sys.exit(1)
+        return
+
+    scratch = None
+    if is_directory or is_zipfile:
+        scratch = ScratchArea(args['scratch_dir'], args['disk_quota'])
+
+    if args['stream'] and (is_directory or is_zipfile):
+        if export:
+            logger.warning("Exporting result does not apply to streamed output")
+        try:
+            for record in extent.iter_directory(files, bbox=args['bounding_box'], tbox=args['time_box'],
+                                                cache=cache, scratch=scratch):
+                print(json.dumps(record), flush=True)
+        except Exception as e:
+            if logger.getEffectiveLevel() >= logging.DEBUG:
+                logger.exception(e)
+            sys.exit(1)
+        finally:
+            scratch.close()
+        return
+
     output = None
     try:
 
         if is_file and not is_zipfile:
-            output = extent.fromFile(files, bbox=args['bounding_box'], tbox=args['time_box'])
+            output = extent.fromFile(files, bbox=args['bounding_box'], tbox=args['time_box'], cache=cache)
             multiple_files = False
         if is_directory or is_zipfile:
-            output = extent.fromDirectory(files, bbox=args['bounding_box'], tbox=args['time_box'], details=True)
+            output = extent.fromDirectory(files, bbox=args['bounding_box'], tbox=args['time_box'], details=True,
+                                          workers=args['workers'], cache=cache, scratch=scratch)
         if is_url:
-            output = extent.from_repository(files, bbox=args['bounding_box'], tbox=args['time_box'], details=True)
+            output = extent.from_repository(files, bbox=args['bounding_box'], tbox=args['time_box'], details=True,
+                                            **repository_options)
 
     except Exception as e:
         if logger.getEffectiveLevel() >= logging.DEBUG:
             logger.exception(e)
         sys.exit(1)
+    finally:
+        if scratch is not None:
+            scratch.close()
 
     if output is None:
         raise Exception("Did not find supported files at {}".format(files))
@@ -2,4 +2,5 @@ from . import handleCSV
 from . import handleVector
 from . import handleRaster
 from . import helpfunctions
+from . import cache
 from . import extent
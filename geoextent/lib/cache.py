@@ -0,0 +1,268 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from .. import __version__ as current_version
+
+logger = logging.getLogger("geoextent")
+
+DEFAULT_MAX_ENTRIES = 1000000
+# share of the entries removed at once when the cache is full
+EVICTION_RATIO = 0.1
+
+
+def default_cache_dir():
+    """
+    Function purpose: location of the cache if the user does not configure one
+    Output: $XDG_CACHE_HOME/geoextent, or ~/.cache/geoextent
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "geoextent")
+
+
+class ResultCache:
+    """On-disk cache of fromFile results, stored in a SQLite database inside cache_dir.
+
+    An entry is keyed by the absolute file path and the extraction options and is only
+    returned while size and modification time of the file (and, with hash_content, a
+    SHA-256 of its content) are unchanged. The least recently used entries are evicted
+    when more than max_entries are stored.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=DEFAULT_MAX_ENTRIES, hash_content=False):
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.max_entries = max_entries
+        self.hash_content = hash_content
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(self.cache_dir, "results.sqlite"), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " path TEXT NOT NULL, options TEXT NOT NULL, fingerprint TEXT NOT NULL,"
+                " result TEXT NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (path, options))"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            self._entries = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _fingerprint(self, filepath):
+        stat = os.stat(filepath)
+        fingerprint = "{}:{}".format(stat.st_size, stat.st_mtime_ns)
+        if self.hash_content:
+            sha256 = hashlib.sha256()
+            with open(filepath, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            fingerprint += ":" + sha256.hexdigest()
+        return fingerprint
+
+    @staticmethod
+    def _options(bbox, tbox, num_sample):
+        return json.dumps({"bbox": bool(bbox), "tbox": bool(tbox), "num_sample": num_sample,
+                           "version": current_version}, sort_keys=True)
+
+    def get(self, filepath, bbox, tbox, num_sample=None):
+        """
+        Function purpose: look up the result of fromFile for a file
+        Output: (True, result) on a hit, (False, None) if the file is not cached or changed since
+        """
+        try:
+            fingerprint = self._fingerprint(filepath)
+        except OSError:
+            return False, None
+
+        path = os.path.abspath(filepath)
+        options = self._options(bbox, tbox, num_sample)
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT fingerprint, result FROM results WHERE path = ? AND options = ?",
+                                           (path, options)).fetchone()
+            if row is None or row[0] != fingerprint:
+                return False, None
+            self._connection.execute("UPDATE results SET accessed = ? WHERE path = ? AND options = ?",
+                                     (time.time(), path, options))
+
+        logger.debug("Using cached result for {}".format(filepath))
+        return True, json.loads(row[1])
+
+    def put(self, filepath, bbox, tbox, num_sample, result):
+        """
+        Function purpose: store the result of fromFile for a file, evicting least recently used entries if full
+        """
+        try:
+            fingerprint = self._fingerprint(filepath)
+        except OSError:
+            return
+
+        path = os.path.abspath(filepath)
+        options = self._options(bbox, tbox, num_sample)
+        with self._lock, self._connection:
+            inserted = self._connection.execute(
+                "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?)",
+                (path, options, fingerprint, json.dumps(result), time.time())).rowcount
+            if not inserted:
+                self._connection.execute(
+                    "UPDATE results SET fingerprint = ?, result = ?, accessed = ? WHERE path = ? AND options = ?",
+                    (fingerprint, json.dumps(result), time.time(), path, options))
+            self._entries += inserted
+
+            if self._entries > self.max_entries:
+                evict = max(int(self.max_entries * EVICTION_RATIO), self._entries - self.max_entries)
+                self._connection.execute(
+                    "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY accessed, rowid LIMIT ?)",
+                    (evict,))
+                self._entries = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                logger.debug("Evicted {} entries from the cache {}".format(evict, self.cache_dir))
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM results")
+            self._entries = 0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+DEFAULT_DOI_TTL = 7 * 24 * 60 * 60
+
+
+class DoiCache:
+    """On-disk cache of resolved DOIs, stored in a SQLite database inside cache_dir.
+
+    A resolved URL is returned for ttl seconds after it was stored.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_DOI_TTL):
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.ttl = ttl
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(self.cache_dir, "doi.sqlite"), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS doi (doi TEXT PRIMARY KEY, url TEXT NOT NULL, resolved REAL NOT NULL)"
+            )
+
+    def get(self, doi):
+        """
+        Function purpose: look up the URL a DOI resolved to
+        Output: the URL, or None if the DOI is not cached or its entry expired
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT url, resolved FROM doi WHERE doi = ?", (doi.lower(),)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        logger.debug("Using cached resolution of DOI {}: {}".format(doi, row[0]))
+        return row[0]
+
+    def put(self, doi, url):
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO doi VALUES (?, ?, ?)", (doi.lower(), url, time.time()))
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM doi")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class DownloadStore:
+    """Persistent store of the files downloaded from repositories, inside store_dir.
+
+    Complete files are kept under objects/<algorithm>/<digest> by their checksum, so a file
+    published in several records is only downloaded once. Interrupted downloads are kept under
+    partial/ and resumed from where they stopped.
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir if store_dir is not None else os.path.join(default_cache_dir(), "downloads")
+        os.makedirs(os.path.join(self.store_dir, "partial"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._url_locks = {}
+
+    @staticmethod
+    def _split_checksum(checksum):
+        algorithm, digest = checksum.split(":", 1)
+        return algorithm.lower().replace("-", ""), digest.lower()
+
+    def _object_path(self, checksum):
+        algorithm, digest = self._split_checksum(checksum)
+        return os.path.join(self.store_dir, "objects", algorithm, digest)
+
+    def lock(self, url):
+        """
+        Function purpose: lock serializing the downloads of the same URL by several threads
+        """
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def partial_path(self, url):
+        """
+        Function purpose: file an (interrupted) download of url is written to
+        """
+        return os.path.join(self.store_dir, "partial", hashlib.sha256(url.encode()).hexdigest())
+
+    @classmethod
+    def supports(cls, checksum):
+        """
+        Function purpose: check if the algorithm of a checksum, e.g. md5:<digest>, is available
+        """
+        return ":" in checksum and cls._split_checksum(checksum)[0] in hashlib.algorithms_available
+
+    def find(self, checksum):
+        """
+        Function purpose: look up a file by its checksum, e.g. md5:<digest>
+        Output: path of the stored file, or None if the store has no file with this checksum
+        """
+        object_path = self._object_path(checksum)
+        return object_path if os.path.isfile(object_path) else None
+
+    def verify(self, filepath, checksum):
+        """
+        Function purpose: check the checksum of a file
+        Output: True if the file has this checksum
+        """
+        algorithm, digest = self._split_checksum(checksum)
+        file_hash = hashlib.new(algorithm)
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                file_hash.update(chunk)
+        return file_hash.hexdigest() == digest
+
+    def add(self, partial_path, checksum):
+        """
+        Function purpose: move a complete download into the store
+        Output: path of the stored file
+        """
+        object_path = self._object_path(checksum)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(partial_path, object_path)
+        return object_path
+
+    @staticmethod
+    def link(object_path, filepath):
+        """
+        Function purpose: make a stored file available at filepath, as hard link if possible
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        try:
+            os.link(object_path, filepath)
+        except OSError:
+            shutil.copyfile(object_path, filepath)
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.store_dir, ignore_errors=True)
+            os.makedirs(os.path.join(self.store_dir, "partial"), exist_ok=True)
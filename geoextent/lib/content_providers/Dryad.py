@@ -1,6 +1,7 @@
 from pathlib import Path
 from requests import HTTPError
 import urllib.parse
+from geoextent.lib import helpfunctions as hf
 from .providers import DoiProvider
 from ..extent import *
 
@@ -15,35 +16,46 @@ class Dryad(DoiProvider):
         self.reference = None
         self.record_id = None
         self.record_id_html = None
+        self.record = None
         self.name = "Dryad"
         self.throttle = False
 
-    def validate_provider(self, reference):
+    def validate_provider(self, reference, url=None):
         self.reference = reference
+        self.url = url
         url = self.get_url
         if any([url.startswith(p) for p in self.host["hostname"]]):
             self.record_id = url.rsplit("/")[-2] + "/" + url.rsplit("/")[-1]
             self.record_id_html = urllib.parse.quote(self.record_id, safe="")
+            self.record = None
             return True
         else:
             return False
 
+    def _get_dataset(self):
+        if self.record is not None:
+            return self.record
+
+        try:
+            resp = self._request(
+                "{}{}".format(
+                    self.host["api"],
+                    self.record_id_html,
+                ),
+                headers={"accept": "application/json"},
+                throttle=self.throttle,
+            )
+            self.record = resp.json()
+        except Exception:
+            m = "The Dryad dataset : " + self.get_url + " does not exist"
+            self.log.warning(m)
+            raise HTTPError(m)
+
+        return self.record
+
     def _get_metadata(self):
         if self.validate_provider:
-            try:
-                resp = self._request(
-                    "{}{}".format(
-                        self.host["api"],
-                        self.record_id_html,
-                    ),
-                    headers={"accept": "application/json"},
-                    throttle=self.throttle,
-                )
-                self.record = resp.json()
-            except Exception:
-                m = "The Dryad dataset : " + self.get_url + " does not exist"
-                self.log.warning(m)
-                raise HTTPError(m)
+            self._get_dataset()
 
             latest_version = self.record["_links"]["stash:version"]["href"]
 
@@ -86,28 +98,37 @@ class Dryad(DoiProvider):
         for j in files:
             link = "https://datadryad.org" + j["_links"]["stash:download"]["href"]
             path = j["path"]
-            file_list.append([link, path])
+            checksum = "{}:{}".format(j["digestType"], j["digest"]) if j.get("digest") and j.get("digestType") else None
+            file_list.append([link, path, checksum, j.get("size")])
         return file_list
 
 
-    def download(self, folder, throttle=False):
+    def get_declared_extent(self):
+        points = []
+        boxes = []
+        for location in self._get_dataset().get("locations", []):
+            point = location.get("point")
+            if point and "longitude" in point and "latitude" in point:
+                points.append((point["longitude"], point["latitude"]))
+            box = location.get("box")
+            if box and all(k in box for k in ["swLongitude", "swLatitude", "neLongitude", "neLatitude"]):
+                boxes.append([box["swLongitude"], box["swLatitude"], box["neLongitude"], box["neLatitude"]])
+        return hf.declared_extent(points=points, boxes=boxes)
+
+    def get_record_size(self):
+        return self._get_dataset().get("storageSize")
+
+    def download(self, folder, throttle=False, on_download=None):
         self.throttle = throttle
         self.log.debug("Downloading Dryad dataset id: {} ".format(self.record_id))
         try:
             # very simple method for download only, instead of 2+ API queries, but without metadata capabilities
-            download_links = [self.host["api"] + self.record_id_html + "/download"]
-            counter = 1
-            for file_link in download_links:
-                resp = self._request(file_link, throttle=self.throttle, stream=True,)
-                filename = "dataset.zip"
-                filepath = os.path.join(folder, filename)
-
-                with open(filepath, "wb") as dst:
-                    for chunk in resp.iter_content(chunk_size=None):
-                        dst.write(chunk)
-
-                self.log.debug("{} out of {} files downloaded.".format(counter, len(download_links)))
-                counter += 1
+            # (the zip file hides names and sizes of the files, so filtered downloads go file by file)
+            if not self._filters_downloads():
+                download_link = self.host["api"] + self.record_id_html + "/download"
+                self._download_files([(download_link, os.path.join(folder, "dataset.zip"))], throttle=self.throttle,
+                                     on_download=on_download)
+                return
         except ValueError as e:
             raise Exception(e)
         except HTTPError as e:
@@ -119,15 +140,8 @@ class Dryad(DoiProvider):
         try:
             print("Downloading individial files.")
             download_links = self._get_file_links
-            counter = 1
-            for file_link, filename in download_links:
-                resp = self._request(file_link, throttle=self.throttle, stream=True,)
-                filepath = Path(folder).joinpath(filename)
-                # TODO: catch http error (?)
-                with open(filepath, "wb") as dst:
-                    for chunk in resp.iter_content(chunk_size=None):
-                        dst.write(chunk)
-                self.log.debug("{} out of {} files downloaded.".format(counter, len(download_links)))
-                counter += 1
+            files = [(file_link, Path(folder).joinpath(filename), checksum, size)
+                     for file_link, filename, checksum, size in download_links]
+            self._download_files(files, throttle=self.throttle, on_download=on_download)
         except ValueError as e:
             raise Exception(e)
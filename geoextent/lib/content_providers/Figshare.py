@@ -1,4 +1,5 @@
 from requests import HTTPError
+from geoextent.lib import helpfunctions as hf
 from .providers import DoiProvider
 from ..extent import *
 
@@ -12,20 +13,26 @@ class Figshare(DoiProvider):
                     }
         self.reference = None
         self.record_id = None
+        self.record = None
         self.name = "Figshare"
         self.throttle = False
 
-    def validate_provider(self, reference):
+    def validate_provider(self, reference, url=None):
         self.reference = reference
+        self.url = url
         url = self.get_url
         if any([url.startswith(p) for p in self.host["hostname"]]):
             self.record_id = url.rsplit("/", maxsplit=1)[1]
+            self.record = None
             return True
         else:
             return False
 
     def _get_metadata(self):
 
+        if self.record is not None:
+            return self.record
+
         if self.validate_provider:
             try:
                 resp = self._request(
@@ -64,24 +71,38 @@ class Figshare(DoiProvider):
         for j in files:
             name = j["name"]
             link = j["download_url"]
-            file_list.append([name, link])
+            md5 = j.get("computed_md5") or j.get("supplied_md5")
+            file_list.append([name, link, "md5:" + md5 if md5 else None, j.get("size")])
             # TODO: files can be empty
         return file_list
 
-    def download(self, folder, throttle=False):
+    def get_declared_extent(self):
+        # Figshare has no spatial metadata of its own, institutions may add geolocation custom fields
+        coordinates = {}
+        for field in self._get_metadata().get("custom_fields", []):
+            name = str(field.get("name", "")).lower()
+            value = field.get("value")
+            if isinstance(value, list):
+                value = value[0] if value else None
+            for axis in ["latitude", "longitude"]:
+                if axis in name:
+                    try:
+                        coordinates[axis] = float(value)
+                    except (TypeError, ValueError):
+                        pass
+        points = [(coordinates["longitude"], coordinates["latitude"])] if len(coordinates) == 2 else []
+        return hf.declared_extent(points=points)
+
+    def get_record_size(self):
+        return sum(f.get("size", 0) for f in self._get_metadata().get("files", []))
+
+    def download(self, folder, throttle=False, on_download=None):
         self.throttle = throttle
         self.log.debug("Downloading Figshare item id: {} ".format(self.record_id))
         try:
             download_links = self._get_file_links
-            counter = 1
-            for filename, file_link in download_links:
-                resp = self._request(file_link, throttle=self.throttle, stream=True,)
-                filepath = os.path.join(folder, filename)
-                # TODO: catch http error (?)
-                with open(filepath, "wb") as dst:
-                    for chunk in resp.iter_content(chunk_size=None):
-                        dst.write(chunk)
-                self.log.debug("{} out of {} files downloaded.".format(counter, len(download_links)))
-                counter += 1
+            files = [(file_link, os.path.join(folder, filename), checksum, size)
+                     for filename, file_link, checksum, size in download_links]
+            self._download_files(files, throttle=self.throttle, on_download=on_download)
         except ValueError as e:
             raise Exception(e)
@@ -1,4 +1,5 @@
 from requests import HTTPError
+from geoextent.lib import helpfunctions as hf
 from .providers import DoiProvider
 from ..extent import *
 
@@ -12,20 +13,26 @@ class Zenodo(DoiProvider):
                      }
         self.reference = None
         self.record_id = None
+        self.record = None
         self.name = "Zenodo"
         self.throttle = False
 
-    def validate_provider(self, reference):
+    def validate_provider(self, reference, url=None):
         self.reference = reference
+        self.url = url
         url = self.get_url
         if any([url.startswith(p) for p in self.host["hostname"]]):
             self.record_id = url.rsplit("/", maxsplit=1)[1]
+            self.record = None
             return True
         else:
             return False
 
     def _get_metadata(self):
 
+        if self.record is not None:
+            return self.record
+
         if self.validate_provider:
             try:
                 resp = self._request(
@@ -62,24 +69,31 @@ class Zenodo(DoiProvider):
 
         file_list = []
         for j in files:
-            file_list.append(j['links']['self'])
+            file_list.append([j['links']['self'], j.get('checksum'), j.get('size')])
         return file_list
 
-    def download(self, folder, throttle=False):
+    def get_declared_extent(self):
+        metadata = self._get_metadata().get("metadata", {})
+        points = [(location["lon"], location["lat"]) for location in metadata.get("locations", [])
+                  if "lon" in location and "lat" in location]
+        periods = []
+        for date in metadata.get("dates", []):
+            if "date" in date:
+                periods.append(date["date"].split("/"))
+            else:
+                periods.append((date.get("start"), date.get("end")))
+        return hf.declared_extent(points=points, periods=periods)
+
+    def get_record_size(self):
+        return sum(f.get("size", 0) for f in self._get_metadata().get("files", []))
+
+    def download(self, folder, throttle=False, on_download=None):
         self.throttle = throttle
         self.log.debug("Downloading Zenodo record id: {} ".format(self.record_id))
         try:
             download_links = self._get_file_links
-            counter = 1
-            for file_link in download_links:
-                resp = self._request(file_link, throttle=self.throttle, stream=True,)
-                filename = file_link.split('/')[-2]
-                filepath = os.path.join(folder, filename)
-                # TODO: catch http error (?)
-                with open(filepath, "wb") as dst:
-                    for chunk in resp.iter_content(chunk_size=None):
-                        dst.write(chunk)
-                self.log.debug("{} out of {} files downloaded.".format(counter, len(download_links)))
-                counter += 1
+            files = [(file_link, os.path.join(folder, file_link.split('/')[-2]), checksum, size)
+                     for file_link, checksum, size in download_links]
+            self._download_files(files, throttle=self.throttle, on_download=on_download)
         except ValueError as e:
             raise Exception(e)
@@ -1,8 +1,138 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
 from requests import Session, HTTPError
+from requests.adapters import HTTPAdapter
 from geoextent.lib import helpfunctions as hf
+import collections
 import logging
-import math
+import os
+import shutil
+import threading
 import time
+import urllib.parse
+
+DEFAULT_DOWNLOAD_WORKERS = 4
+
+# extensions of files read together with the other files of the same name (see DoiProvider._file_group):
+# the parts of a shapefile and rasters with their world files
+COMPANION_EXTENSIONS = {
+    ".shp", ".shx", ".dbf", ".prj", ".cpg", ".qpj", ".sbn", ".sbx", ".fbn", ".fbx", ".ain", ".aih", ".atx", ".ixs",
+    ".mxs",
+    ".tif", ".tiff", ".tfw", ".tifw", ".tiffw", ".jpg", ".jpeg", ".jgw", ".jpgw", ".png", ".pgw", ".pngw", ".gif",
+    ".gfw", ".jp2", ".j2w", ".bmp", ".bpw", ".wld",
+}
+# suffixes of sidecar files named after the complete name of the file they belong to, e.g. raster.tif.aux.xml
+SIDECAR_SUFFIXES = (".aux.xml", ".shp.xml", ".ovr", ".msk")
+
+# requests per second with throttle=True to hosts that do not announce their rate limit
+DEFAULT_THROTTLE_RATE = 1
+# requests a host may receive at once while its rate limit is not exhausted
+DEFAULT_BURST = 4
+# seconds to wait after a 429 response that does not tell when to retry
+DEFAULT_RETRY_AFTER = 60
+
+
+class RateLimiter:
+    """Token bucket of the requests to one host, shared by all threads and providers (see rate_limiter).
+
+    The rate is learned from the x-ratelimit-* (Zenodo) and ratelimit-* (Dryad) headers of the responses:
+    the requests remaining in the current window are spread evenly until the window resets. A 429
+    response blocks the host until the window resets or for Retry-After seconds.
+    """
+
+    def __init__(self, burst=DEFAULT_BURST):
+        self.burst = burst
+        self.rate = None
+        self.tokens = burst
+        self.blocked_until = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, default_rate=None):
+        """Waits until a request may be sent
+        default_rate -- requests per second while the host did not announce its limit, None for no limit
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                rate = self.rate if self.rate is not None else default_rate
+                if rate is not None:
+                    self.tokens = min(self.burst, self.tokens + (now - self._updated) * rate)
+                self._updated = now
+
+                if now >= self.blocked_until and (rate is None or self.tokens >= 1):
+                    if rate is not None:
+                        self.tokens -= 1
+                    return
+                wait_seconds = max(self.blocked_until - now, (1 - self.tokens) / rate if rate else 0)
+            time.sleep(wait_seconds)
+
+    @staticmethod
+    def _seconds_until(reset):
+        # reset is a Unix time (Zenodo) or a number of seconds (IETF draft headers)
+        reset = float(reset)
+        return reset - time.time() if reset > 10 ** 9 else reset
+
+    def update(self, response):
+        """Learns the rate limit of the host from a response"""
+        values = [
+            response.headers.get("x-ratelimit-remaining"),  # Zenodo
+            response.headers.get("x-ratelimit-reset"),      # Zenodo
+            response.headers.get("ratelimit-remaining"),    # Dryad
+            response.headers.get("ratelimit-reset"),        # Dryad
+        ]
+
+        match values:
+            case [None, None, None, None]:
+                remaining, window = None, None
+            case [_, _, None, None]:
+                remaining, window = int(values[0]), self._seconds_until(values[1])
+            case [None, None, _, _]:
+                remaining, window = int(values[2]), self._seconds_until(values[3])
+            case _:
+                remaining, window = None, None
+
+        with self._lock:
+            now = time.monotonic()
+            if remaining is not None:
+                window = max(window, 1)
+                self.rate = max(remaining, 1) / window
+                self.tokens = min(self.tokens, remaining)
+                if remaining == 0:
+                    self.blocked_until = max(self.blocked_until, now + window)
+
+            if response.status_code == 429:
+                retry_after = response.headers.get("retry-after")
+                if retry_after is not None and retry_after.isdigit():
+                    wait_seconds = int(retry_after)
+                elif window is not None:
+                    wait_seconds = window
+                else:
+                    wait_seconds = DEFAULT_RETRY_AFTER
+                self.blocked_until = max(self.blocked_until, now + wait_seconds)
+                logging.getLogger("geoextent").info("Rate limit reached, waiting {:.0f} s".format(wait_seconds))
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def rate_limiter(url):
+    """RateLimiter of the host of url"""
+    host = urllib.parse.urlsplit(url).netloc
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = RateLimiter()
+        return _rate_limiters[host]
+
+
+def pooled_session(pool_size=DEFAULT_DOWNLOAD_WORKERS):
+    """requests Session keeping up to pool_size connections per host open for reuse"""
+    session = Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class ContentProvider:
@@ -13,12 +143,35 @@ class ContentProvider:
 class DoiProvider(ContentProvider):
 
     def __init__(self):
-        self.session = Session()
+        super().__init__()
+        # may be replaced by a session shared with other providers of the same host
+        self.session = pooled_session()
+        self.download_workers = DEFAULT_DOWNLOAD_WORKERS
+        self.doi_cache = None
+        # DOIs resolved by this provider, may be replaced by the dict shared by the providers of one
+        # from_repository call or from_repositories session
+        self.resolved_dois = {}
+        self.url = None
+        # called with (url, filepath) before a file is downloaded, returns True if it read the file remotely
+        self.remote_reader = None
+        # DownloadStore keeping downloads across runs, or None to download into the target folder only
+        self.download_store = None
+        # download budget, see _plan_downloads
+        self.skip_unsupported = False
+        self.max_file_size = None
+        self.max_record_size = None
+        self.skipped_files = []
 
     def _request(self, url, throttle=False, **kwargs):
+        """GET request through the rate limiter of the host
+        throttle -- keep to DEFAULT_THROTTLE_RATE requests per second while the host did not announce its limit
+        """
+        limiter = rate_limiter(url)
         while True:
+            limiter.acquire(DEFAULT_THROTTLE_RATE if throttle else None)
             try:
                 response = self.session.get(url, **kwargs)
+                limiter.update(response)
                 response.raise_for_status()
                 break  # break while loop
             except HTTPError as e:
@@ -28,59 +181,188 @@ class DoiProvider(ContentProvider):
                 # zenodo    dict_keys(['410', '502', '404', '504'])
                 # https://developer.mozilla.org/en-US/docs/Web/HTTP/Reference/Status
 
-                if e.response.status_code == 429:
-                    self._throttle(e.response)
-                else:
-                    print(e.response.status_code)
+                # on 429 the limiter blocks the host until the request may be retried
+                if e.response.status_code != 429:
+                    self.log.debug("Request to {} failed with status {}".format(url, e.response.status_code))
                     raise
 
-        if throttle:
-            self._throttle(response)
-        
         return response
-    
-    def _throttle(self, response):
-        values = [
-            (response.headers.get("x-ratelimit-remaining")),  # Zenodo
-            (response.headers.get("x-ratelimit-reset")),      # Zenodo
-            (response.headers.get("ratelimit-remaining")),    # Dryad
-            (response.headers.get("ratelimit-reset")),        # Dryad
-        ]
-        http_error = response.status_code
 
-        wait_seconds = 1
+    def _download_file(self, url, filepath, throttle=False, remote=False, checksum=None):
+        if remote and self.remote_reader(url, filepath):
+            return None
+        if self.download_store is not None:
+            self._download_file_to_store(url, filepath, throttle, checksum)
+            return filepath
+        resp = self._request(url, throttle=throttle, stream=True,)
+        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+        with open(filepath, "wb") as dst:
+            for chunk in resp.iter_content(chunk_size=None):
+                dst.write(chunk)
+        return filepath
 
-        match values:
-            case [None, None, None, None]:
-                if http_error == 429:
-                    wait_seconds = 60
-                else:
-                    wait_seconds = 1
+    def _download_file_to_store(self, url, filepath, throttle=False, checksum=None):
+        """Downloads a file through self.download_store: a stored file with the same checksum is reused,
+        an interrupted download of the url is resumed with an HTTP range request
+        checksum -- checksum of the file, e.g. md5:<digest>, the download is verified against (default None)
+        """
+        store = self.download_store
+        if checksum is not None and not store.supports(checksum):
+            self.log.debug("Checksum {} of {} is not supported, the download is not verified".format(checksum, url))
+            checksum = None
 
-            case [_, _, None, None]:
-                remaining = int(values[0])
-                reset = int(values[1])
+        with store.lock(url):
+            object_path = store.find(checksum) if checksum is not None else None
+            if object_path is not None:
+                self.log.debug("Using stored file {} for {}".format(object_path, url))
+                store.link(object_path, filepath)
+                return
+
+            partial_path = store.partial_path(url)
+            offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+            try:
+                resp = self._request(url, throttle=throttle, stream=True,
+                                     headers={"Range": "bytes={}-".format(offset)} if offset else None)
+            except HTTPError as e:
+                # range not satisfiable: the interrupted download is complete already
+                if not offset or e.response is None or e.response.status_code != 416:
+                    raise
+                resp = None
 
-                if remaining < 2 or http_error == 429:
-                    wait_seconds = math.ceil(reset - time.time())
+            if resp is not None:
+                resume = offset and resp.status_code == 206
+                if resume:
+                    self.log.debug("Resuming download of {} at byte {}".format(url, offset))
+                with open(partial_path, "ab" if resume else "wb") as dst:
+                    for chunk in resp.iter_content(chunk_size=None):
+                        dst.write(chunk)
 
-            case [None, None, _, _]:
-                remaining = int(values[2])
-                reset = int(values[3])
+            if checksum is None:
+                Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(partial_path, filepath)
+                return
 
-                if remaining < 2 or http_error == 429:
-                    wait_seconds = math.ceil(reset - time.time())
+            if not store.verify(partial_path, checksum):
+                os.remove(partial_path)
+                raise Exception("The download of {} does not match its checksum {}".format(url, checksum))
+            store.link(store.add(partial_path, checksum), filepath)
 
-            case _:
-                if http_error == 429:
-                    wait_seconds = 60
-                else:
-                    wait_seconds = 1
+    def get_declared_extent(self):
+        """Extent the record declares in its metadata, see hf.declared_extent
+        returns None if the record or the provider declares no extent
+        """
+        return None
+
+    def get_record_size(self):
+        """Total size of the files of the record in bytes, None if the provider does not tell"""
+        return None
+
+    def _filters_downloads(self):
+        return self.skip_unsupported or self.max_file_size is not None or self.max_record_size is not None
+
+    def _plan_downloads(self, files):
+        """Selects the files to download: groups of files (see _file_group) without a supported format
+        (if self.skip_unsupported), with a file larger than self.max_file_size bytes or not fitting into
+        the self.max_record_size bytes left for the record are skipped and listed in self.skipped_files
+        files -- list of (url, filepath, checksum, size) tuples, files of unknown size count as empty
+        """
+        groups = collections.defaultdict(list)
+        for file in files:
+            groups[self._file_group(file[1])].append(file)
+
+        planned = []
+        record_size = 0
+        for group_files in groups.values():
+            sizes = [size or 0 for _, _, _, size in group_files]
+            reason = None
+            if self.skip_unsupported and not any(hf.is_supported_file(filepath) for _, filepath, _, _ in group_files):
+                reason = "unsupported format"
+            elif self.max_file_size is not None and max(sizes) > self.max_file_size:
+                reason = "file larger than {} bytes".format(self.max_file_size)
+            elif self.max_record_size is not None and record_size + sum(sizes) > self.max_record_size:
+                reason = "record larger than {} bytes".format(self.max_record_size)
 
-        print(f"INFO: Sleep {wait_seconds:.0f} s...")
-        time.sleep(wait_seconds)
+            if reason is None:
+                planned += group_files
+                record_size += sum(sizes)
+                continue
+            for _, filepath, _, size in group_files:
+                self.log.info("Skipping download of {} ({} bytes): {}".format(Path(filepath).name, size, reason))
+                self.skipped_files.append({"filename": Path(filepath).name, "size": size, "reason": reason})
 
-        return
+        return planned
+
+    @staticmethod
+    def _file_group(filepath):
+        # files with a companion file extension and the same name belong together, e.g. the .shp, .shx and .dbf of
+        # a shapefile or a .tif with its .tfw; .aux.xml, .ovr and .shp.xml sidecars belong to the file they extend
+        filepath = Path(filepath)
+        name = filepath.name.lower()
+        for suffix in SIDECAR_SUFFIXES:
+            if name.endswith(suffix) and len(name) > len(suffix):
+                name = name[:-len(suffix)]
+                break
+        stem, extension = os.path.splitext(name)
+        if extension in COMPANION_EXTENSIONS:
+            return str(filepath.parent), stem
+        return str(filepath.parent), name
+
+    def _download_files(self, files, throttle=False, on_download=None):
+        """Downloads files concurrently with up to self.download_workers threads
+        files -- list of (url, filepath, checksum, size) tuples, checksum and size may be left out
+        on_download -- called with the filepaths of a group of files (same folder and name, see _file_group)
+                       as soon as all of them are downloaded, returning False stops the download (default None)
+        A new download only starts when a previous one finished and on_download returned.
+        Files without companion files are first offered to self.remote_reader, if set, and only downloaded if
+        it did not read them.
+        """
+        files = self._plan_downloads([(*file, None, None)[:4] for file in files])
+        files = sorted(files, key=lambda file: self._file_group(file[1]))
+        group_sizes = collections.Counter(self._file_group(filepath) for _, filepath, _, _ in files)
+        downloaded = collections.defaultdict(list)
+        queue = iter(files)
+        counter = 0
+
+        workers = max(1, min(self.download_workers, len(files)))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+
+            def submit_next():
+                for url, filepath, checksum, _ in queue:
+                    remote = self.remote_reader is not None and group_sizes[self._file_group(filepath)] == 1
+                    pending.add(executor.submit(self._download_file, url, filepath, throttle, remote, checksum))
+                    break
+
+            for _ in range(workers):
+                submit_next()
+
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        filepath = future.result()
+                        counter += 1
+                        if filepath is None:
+                            self.log.debug("{} out of {} files read remotely.".format(counter, len(files)))
+                            submit_next()
+                            continue
+                        self.log.debug("{} out of {} files downloaded.".format(counter, len(files)))
+
+                        group = self._file_group(filepath)
+                        downloaded[group].append(filepath)
+                        if on_download is not None and len(downloaded[group]) == group_sizes[group]:
+                            if on_download(downloaded.pop(group)) is False:
+                                self.log.debug("Download stopped after {} out of {} files.".format(counter, len(files)))
+                                for future_pending in pending:
+                                    future_pending.cancel()
+                                return
+                        submit_next()
+            except Exception:
+                for future_pending in pending:
+                    future_pending.cancel()
+                raise
 
     def _type_of_reference(self):
         if hf.doi_regexp.match(self.reference):
@@ -88,20 +370,43 @@ class DoiProvider(ContentProvider):
         elif hf.https_regexp.match(self.reference):
             return 'Link'
 
+    def resolve(self, reference):
+        """Resolves a DOI to the URL of its landing page, other references are returned unchanged.
+        Resolutions are kept in self.resolved_dois and in self.doi_cache, if set.
+        """
+        self.reference = reference
+        self.url = None
+        return self.get_url
+
     @property
     def get_url(self):
 
+        if self.url is not None:
+            return self.url
+
         if self._type_of_reference() == "DOI":
             doi = hf.doi_regexp.match(self.reference).group(2)
 
-            try:
-                resp = self._request("https://doi.org/{}".format(doi))
-                resp.raise_for_status()
+            url = self.resolved_dois.get(doi.lower())
+            if url is None and self.doi_cache is not None:
+                url = self.doi_cache.get(doi)
 
-            except HTTPError:
-                return doi
+            if url is None:
+                try:
+                    resp = self._request("https://doi.org/{}".format(doi))
+                    resp.raise_for_status()
 
-            return resp.url
+                except HTTPError:
+                    return doi
+
+                url = resp.url
+                if self.doi_cache is not None:
+                    self.doi_cache.put(doi, url)
+
+            self.resolved_dois[doi.lower()] = url
+            self.url = url
 
         else:
-            return self.reference
+            self.url = self.reference
+
+        return self.url
@@ -1,3 +1,6 @@
+import concurrent.futures
+import contextlib
+import itertools
 import logging
 import os
 import patoolib
@@ -5,30 +8,45 @@ import random
 import threading
 import time
 import tempfile
-from traitlets import List
+from osgeo import gdal
+from traitlets import Int, List
 from traitlets.config import Application
 from .content_providers import Dryad
 from .content_providers import Figshare
 from .content_providers import Zenodo
+from .content_providers.providers import DEFAULT_DOWNLOAD_WORKERS, DoiProvider, pooled_session
 from . import handleCSV
+from . import handleMultidim
 from . import handleRaster
 from . import handleVector
 from . import helpfunctions as hf
+from .cache import ResultCache
+from .scratch import DiskQuotaExceeded, ExtractionError, ScratchArea
 
 logger = logging.getLogger("geoextent")
-handle_modules = {'CSV': handleCSV, "raster": handleRaster, "vector": handleVector}
 
+# formats whose extent GDAL reads from a few blocks of the file, so that reading them remotely pays off
+REMOTE_FORMATS = {"tif", "tiff", "gpkg", "jp2", "fgb"}
+# records from_repositories keeps submitted per record worker, so that long lists of identifiers are read lazily
+RECORDS_IN_FLIGHT_PER_WORKER = 2
+# tried in this order, gridded datasets with coordinate variables are read with handleMultidim before handleRaster
+handle_modules = {'CSV': handleCSV, "multidim": handleMultidim, "raster": handleRaster, "vector": handleVector}
 
-def compute_bbox_wgs84(module, path):
+
+def compute_bbox_wgs84(module, path, dataset=None):
     """
     input "module": type module, module from which methods shall be used \n
     input "path": type string, path to file \n
+    input "dataset": type gdal.Dataset, already opened handle of the file (optional) \n
     returns a bounding box, type list, length = 4 , type = float,
         schema = [min(longs), min(lats), max(longs), max(lats)],
         the bounding box has either its original crs or WGS84(transformed).
     """
     logger.debug("compute_bbox_wgs84: {}".format(path))
-    spatial_extent_origin = module.getBoundingBox(path)
+    if dataset is None:
+        spatial_extent_origin = module.getBoundingBox(path)
+    else:
+        spatial_extent_origin = module.getBoundingBox(path, dataset=dataset)
 
     try:
         if spatial_extent_origin['crs'] == str(hf.WGS84_EPSG_ID):
@@ -63,6 +81,9 @@ def fromDirectory(
     details: bool = False,
     timeout: None | int | float = None,
     level: int = 0,
+    workers: None | int = None,
+    cache: None | ResultCache = None,
+    scratch: None | ScratchArea = None,
 ):
     """Extracts geoextent from a directory/archive
     Keyword arguments:
@@ -70,6 +91,9 @@ def fromDirectory(
     bbox -- True if bounding box is requested (default False)
     tbox -- True if time box is requested (default False)
     timeout -- maximal allowed run time in seconds (default None)
+    workers -- number of processes extracting files in parallel, None or 1 extracts sequentially (default None)
+    cache -- ResultCache reusing the results of unchanged files (default None)
+    scratch -- ScratchArea archives are extracted to, with an optional disk quota (default None, a temporary folder)
     """
 
     logger.info("Extracting bbox={} tbox={} from Directory {}".format(bbox, tbox, path))
@@ -77,55 +101,119 @@ def fromDirectory(
     if not bbox and not tbox:
         logger.error("Require at least one of extraction options, but bbox is {} and tbox is {}".format(bbox, tbox))
         raise Exception("No extraction options enabled!")
-    metadata = {}
+
+    if scratch is None:
+        scratch = ScratchArea()
+        try:
+            return fromDirectory(path, bbox, tbox, details, timeout, level, workers, cache, scratch)
+        finally:
+            scratch.close()
+
+    if workers is not None and workers > 1:
+        return _fromDirectoryParallel(path, bbox, tbox, details, timeout, workers, cache, scratch)
+
     # initialization of later output dict
     metadata_directory = {}
 
     timeout_flag = False
     start_time = time.time()
 
-    # TODO: eventually delete all extracted content
+    is_archive = hf.is_archive(path)
 
-    is_archive = patoolib.is_archive(path)
+    # the extraction of an archive is deleted as soon as the archive is summarized
+    with contextlib.ExitStack() as extraction:
+        files = None
+        if is_archive:
+            logger.info("Inspecting archive {}".format(path))
+            # read the members through GDAL's virtual file systems, extracting only archives GDAL cannot read
+            try:
+                extract_folder = extraction.enter_context(scratch.open_archive(path))
+            except DiskQuotaExceeded:
+                raise
+            except ExtractionError as e:
+                # nested archives are skipped by the caller, a top-level archive gives an empty result
+                if level > 0:
+                    raise
+                scratch.skip(path, hf.member_size(path), str(e))
+                files = []
+            else:
+                logger.info("Extract_folder archive {}".format(extract_folder))
+                path = extract_folder
+
+        if files is None:
+            files = hf.list_directory(path)
+        if timeout:
+            random.seed(0)
+            random.shuffle(files)
+
+        for filename, member_path in files:
+            elapsed_time = time.time() - start_time
+            if timeout and elapsed_time > timeout:
+                if level == 0:
+                    logger.warning(f"Timeout reached after {timeout} seconds, returning partial results.")
+                    timeout_flag = True
+                break
+
+            logger.info("path {}, folder/archive {}".format(path, filename))
+
+            remaining_time = timeout - elapsed_time if timeout else None
+
+            try:
+                with scratch.member_on_disk(member_path, filename) as absolute_path:
+                    member_is_archive = hf.is_archive(absolute_path)
+
+                    if member_is_archive:
+                        logger.info("**Inspecting folder {}, is archive ? {}**".format(filename, str(member_is_archive)))
+                        metadata_directory[filename] = fromDirectory(absolute_path, bbox, tbox, details=True, timeout=remaining_time, level=level+1,
+                                                                     cache=cache, scratch=scratch)
+                    else:
+                        logger.info("Inspecting folder {}, is archive ? {}".format(filename, str(member_is_archive)))
+                        # a Zarr store is one dataset, not a folder of thousands of chunk files
+                        if hf.is_directory(absolute_path) and not hf.is_zarr_store(absolute_path):
+                            metadata_directory[filename] = fromDirectory(absolute_path, bbox, tbox, details=True, timeout=remaining_time, level=level+1,
+                                                                         cache=cache, scratch=scratch)
+                        else:
+                            metadata_file = fromFile(absolute_path, bbox, tbox,
+                                                     cache=_member_cache(cache, scratch, absolute_path))
+                            metadata_directory[str(filename)] = metadata_file
+            except ExtractionError as e:
+                # leave the member out, the other members still make up a partial result
+                scratch.skip(member_path, hf.member_size(member_path), str(e))
 
-    if is_archive:
-        logger.info("Inspecting archive {}".format(path))
-        extract_folder = hf.extract_archive(path)
-        logger.info("Extract_folder archive {}".format(extract_folder))
-        path = extract_folder
+        file_format = "archive" if is_archive else 'folder'
+        metadata = _summarize_directory(metadata_directory, path, file_format, bbox, tbox, details)
 
-    files = os.listdir(path)
-    if timeout:
-        random.seed(0)
-        random.shuffle(files)
+    if timeout and timeout_flag:
+        metadata["timeout"] = timeout
 
-    for filename in files:
-        elapsed_time = time.time() - start_time
-        if timeout and elapsed_time > timeout:
-            if level == 0:
-                logger.warning(f"Timeout reached after {timeout} seconds, returning partial results.")
-                timeout_flag = True
-            break
+    if level == 0 and scratch.skipped:
+        metadata["skipped_files"] = scratch.skipped
 
-        logger.info("path {}, folder/archive {}".format(path, filename))
-        absolute_path = os.path.join(path, filename)
-        is_archive = patoolib.is_archive(absolute_path)
+    return metadata
 
-        remaining_time = timeout - elapsed_time if timeout else None
 
-        if is_archive:
-            logger.info("**Inspecting folder {}, is archive ? {}**".format(filename, str(is_archive)))
-            metadata_directory[filename] = fromDirectory(absolute_path, bbox, tbox, details=True, timeout=remaining_time, level=level+1)
-        else:
-            logger.info("Inspecting folder {}, is archive ? {}".format(filename, str(is_archive)))
-            if os.path.isdir(absolute_path):
-                metadata_directory[filename] = fromDirectory(absolute_path, bbox, tbox, details=True, timeout=remaining_time, level=level+1)
-            else:
-                metadata_file = fromFile(absolute_path, bbox, tbox)
-                metadata_directory[str(filename)] = metadata_file
+def _member_cache(cache, scratch, path):
+    """The cache for the files of a directory/archive
+    Keyword arguments:
+    cache -- ResultCache or None
+    scratch -- ScratchArea archives are extracted to
+    path -- path of a file or folder
+    returns None for members of archives, which are read through a GDAL virtual file system or extracted to the
+    scratch area under a new path in every run, so that their entries would never be found again
+    """
+    if cache is None or hf.is_virtual(path) or scratch.contains(path):
+        return None
+    return cache
+
 
-    file_format = "archive" if is_archive else 'folder'
-    metadata['format'] = file_format
+def _summarize_directory(metadata_directory, path, file_format, bbox, tbox, details):
+    """Merges the extents of the entries of a directory/archive into its metadata
+    Keyword arguments:
+    metadata_directory -- extraction results of the entries of the directory (dict)
+    path -- directory path
+    file_format -- 'folder' or 'archive'
+    """
+    metadata = {'format': file_format}
 
     if bbox:
         bbox_ext = hf.bbox_merge(metadata_directory, path)
@@ -148,19 +236,215 @@ def fromDirectory(
     if details:
         metadata['details'] = metadata_directory
 
-    if timeout and timeout_flag:
+    return metadata
+
+
+def _fromDirectoryParallel(path, bbox, tbox, details, timeout, workers, cache, scratch):
+    """Extracts geoextent from a directory/archive with a pool of worker processes
+    Keyword arguments:
+    path -- directory/archive path
+    timeout -- maximal allowed run time in seconds, files not finished by then are left out
+    workers -- number of worker processes
+    cache -- ResultCache, only used in this process: cached files are not submitted and new results are stored
+    scratch -- ScratchArea archives are extracted to, the extractions are kept until all files are extracted
+    """
+    logger.info("Extracting from Directory {} with {} worker processes".format(path, workers))
+
+    deadline = time.time() + timeout if timeout else None
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    extractions = contextlib.ExitStack()
+    try:
+        try:
+            tree = _schedule_directory(path, bbox, tbox, executor, scratch, extractions, shuffle=bool(timeout),
+                                       cache=cache)
+        except DiskQuotaExceeded:
+            raise
+        except ExtractionError as e:
+            # only the top-level archive gets here, nested archives are skipped in _schedule_directory
+            scratch.skip(path, hf.member_size(path), str(e))
+            tree = {"path": path, "format": "archive", "entries": {}, "cache": None}
+        metadata, timeout_flag = _collect_directory(tree, bbox, tbox, details, deadline)
+    finally:
+        # after a timeout, the files not started yet are cancelled, but the workers still reading a file
+        # are waited for before its extraction is deleted
+        executor.shutdown(wait=True, cancel_futures=True)
+        extractions.close()
+
+    if timeout_flag:
+        logger.warning(f"Timeout reached after {timeout} seconds, returning partial results.")
         metadata["timeout"] = timeout
 
+    if scratch.skipped:
+        metadata["skipped_files"] = scratch.skipped
+
     return metadata
 
 
-def fromFile(filepath, bbox=True, tbox=True, num_sample=None):
+def _schedule_directory(path, bbox, tbox, executor, scratch, extractions, shuffle=False, cache=None):
+    """Walks a directory/archive in the same order as fromDirectory and submits every file to the executor
+    scratch -- ScratchArea archives are extracted to
+    extractions -- contextlib.ExitStack keeping the extractions until it is closed
+    returns the directory tree, type dict, with futures in place of the results of the files and the cache the
+    results are stored in, None for the members of archives
+    """
+    is_archive = hf.is_archive(path)
+
+    if is_archive:
+        logger.info("Inspecting archive {}".format(path))
+        path = extractions.enter_context(scratch.open_archive(path))
+
+    files = hf.list_directory(path)
+    if shuffle:
+        random.seed(0)
+        random.shuffle(files)
+
+    directory_cache = _member_cache(cache, scratch, path)
+    entries = {}
+    for filename, member_path in files:
+        try:
+            absolute_path = extractions.enter_context(scratch.member_on_disk(member_path, filename))
+            if hf.is_archive(absolute_path) or (hf.is_directory(absolute_path) and not hf.is_zarr_store(absolute_path)):
+                entries[filename] = _schedule_directory(absolute_path, bbox, tbox, executor, scratch, extractions,
+                                                        shuffle, cache)
+                continue
+        except ExtractionError as e:
+            # leave the member out, the other members still make up a partial result
+            scratch.skip(member_path, hf.member_size(member_path), str(e))
+            continue
+
+        found, metadata_file = directory_cache.get(absolute_path, bbox, tbox) if directory_cache is not None \
+            else (False, None)
+        if found:
+            entries[filename] = concurrent.futures.Future()
+            entries[filename].set_result(metadata_file)
+        else:
+            entries[filename] = executor.submit(fromFile, absolute_path, bbox, tbox)
+
+    return {"path": path, "format": "archive" if is_archive else 'folder', "entries": entries,
+            "cache": directory_cache}
+
+
+def _collect_directory(tree, bbox, tbox, details, deadline=None):
+    """Waits for the files of a tree from _schedule_directory and merges them bottom-up
+    returns the metadata of the directory and whether files were left out because the deadline passed
+    """
+    metadata_directory = {}
+    timeout_flag = False
+
+    for filename, entry in tree["entries"].items():
+        if isinstance(entry, dict):
+            metadata_directory[filename], subtree_timeout = _collect_directory(entry, bbox, tbox, True, deadline)
+            timeout_flag = timeout_flag or subtree_timeout
+        else:
+            remaining_time = max(deadline - time.time(), 0) if deadline else None
+            try:
+                metadata_directory[filename] = entry.result(timeout=remaining_time)
+            except concurrent.futures.TimeoutError:
+                entry.cancel()
+                timeout_flag = True
+                continue
+            if tree["cache"] is not None:
+                tree["cache"].put(os.path.join(tree["path"], filename), bbox, tbox, None, metadata_directory[filename])
+
+    metadata = _summarize_directory(metadata_directory, tree["path"], tree["format"], bbox, tbox, details)
+    return metadata, timeout_flag
+
+
+def iter_directory(path: str, bbox: bool = False, tbox: bool = False, cache: None | ResultCache = None,
+                   scratch: None | ScratchArea = None):
+    """Extracts geoextent from a directory/archive file by file
+    Keyword arguments:
+    path -- directory/archive path
+    bbox -- True if bounding box is requested (default False)
+    tbox -- True if time box is requested (default False)
+    cache -- ResultCache reusing the results of unchanged files (default None)
+    scratch -- ScratchArea archives are extracted to, with an optional disk quota (default None, a temporary folder)
+    Yields one record per file as soon as it is extracted, type dict, with the keys
+    filename -- path of the file relative to path (archives appear as folders)
+    metadata -- result of fromFile, None if the file format is not supported or the file was skipped
+    merged -- extent merged from all files yielded so far (crs, bbox and/or tbox)
+    skipped -- only for archives and files left out because of the disk quota or an extraction error, the entry
+    of scratch.skipped with filename, size and reason
+    """
+
+    logger.info("Streaming bbox={} tbox={} from Directory {}".format(bbox, tbox, path))
+
+    if not bbox and not tbox:
+        logger.error("Require at least one of extraction options, but bbox is {} and tbox is {}".format(bbox, tbox))
+        raise Exception("No extraction options enabled!")
+
+    if scratch is None:
+        scratch = ScratchArea()
+        try:
+            yield from iter_directory(path, bbox, tbox, cache, scratch)
+        finally:
+            scratch.close()
+        return
+
+    merged = {}
+
+    for filename, absolute_path, skipped in _walk_directory(path, scratch):
+        if skipped is not None:
+            # the extent is partial, the left out files are reported where they would have been
+            yield {"filename": filename, "metadata": None, "merged": merged, "skipped": skipped}
+            continue
+
+        metadata_file = fromFile(absolute_path, bbox, tbox, cache=_member_cache(cache, scratch, absolute_path))
+
+        if metadata_file is not None:
+            # merge with the running extent only, so memory stays flat however many files there are
+            metadata_merge = {"merged": merged, filename: metadata_file}
+            if bbox and "bbox" in metadata_file:
+                bbox_ext = hf.bbox_merge(metadata_merge, path)
+                if bbox_ext is not None:
+                    merged = {**merged, "crs": bbox_ext['crs'], "bbox": bbox_ext['bbox']}
+            if tbox and "tbox" in metadata_file:
+                merged = {**merged, "tbox": hf.tbox_merge(metadata_merge, path)}
+
+        yield {"filename": filename, "metadata": metadata_file, "merged": merged}
+
+
+def _walk_directory(path, scratch, relative_path=""):
+    """Walks a directory/archive in the same order as fromDirectory, reading archives on the way
+    scratch -- ScratchArea archives are extracted to, every extraction is deleted once it is walked
+    yields (path relative to the walked directory, absolute path, None) for every file, and
+    (path relative to the walked directory, None, entry of scratch.skipped) for every skipped archive or file
+    """
+    with contextlib.ExitStack() as extraction:
+        if hf.is_archive(path):
+            logger.info("Inspecting archive {}".format(path))
+            try:
+                path = extraction.enter_context(scratch.open_archive(path))
+            except DiskQuotaExceeded:
+                raise
+            except ExtractionError as e:
+                # nested archives are skipped by the caller, a top-level archive is reported as skipped
+                if relative_path:
+                    raise
+                yield os.path.basename(path), None, scratch.skip(path, hf.member_size(path), str(e))
+                return
+
+        for filename, member_path in hf.list_directory(path):
+            relative_filename = os.path.join(relative_path, filename)
+            try:
+                with scratch.member_on_disk(member_path, filename) as absolute_path:
+                    if hf.is_archive(absolute_path) or (hf.is_directory(absolute_path)
+                                                        and not hf.is_zarr_store(absolute_path)):
+                        yield from _walk_directory(absolute_path, scratch, relative_filename)
+                    else:
+                        yield relative_filename, absolute_path, None
+            except ExtractionError as e:
+                yield relative_filename, None, scratch.skip(member_path, hf.member_size(member_path), str(e))
+
+
+def fromFile(filepath, bbox=True, tbox=True, num_sample=None, cache=None):
     """ Extracts geoextent from a file
     Keyword arguments:
     path -- filepath
     bbox -- True if bounding box is requested (default False)
     tbox -- True if time box is requested (default False)
     num_sample -- sample size to determine time format (Only required for csv files)
+    cache -- ResultCache reusing the result if the file is unchanged (default None)
     """
     logger.info("Extracting bbox={} tbox={} from file {}".format(bbox, tbox, filepath))
 
@@ -168,6 +452,13 @@ def fromFile(filepath, bbox=True, tbox=True, num_sample=None):
         logger.error("Require at least one of extraction options, but bbox is {} and tbox is {}".format(bbox, tbox))
         raise Exception("No extraction options enabled!")
 
+    if cache is not None:
+        found, metadata = cache.get(filepath, bbox, tbox, num_sample)
+        if not found:
+            metadata = fromFile(filepath, bbox, tbox, num_sample)
+            cache.put(filepath, bbox, tbox, num_sample, metadata)
+        return metadata
+
     file_format = os.path.splitext(filepath)[1][1:]
 
     usedModule = None
@@ -175,20 +466,38 @@ def fromFile(filepath, bbox=True, tbox=True, num_sample=None):
     # initialization of later output dict
     metadata = {}
 
+    # open the file only once, all handlers classify the file from the same handle
+    dataset = hf.open_dataset(filepath)
+
     # get the module that will be called (depending on the format of the file)
 
-    for i in handle_modules:
-        valid = handle_modules[i].checkFileSupported(filepath)
-        if valid:
-            usedModule = handle_modules[i]
-            logger.info("{} is being used to inspect {} file".format(usedModule.get_handler_name(), filepath))
-            break
+    if dataset is not None:
+        for i in handle_modules:
+            handle = dataset
+            if handle_modules[i] is handleMultidim:
+                # handleMultidim reads through GDAL's multidimensional API, gridded datasets are opened with it once
+                handle = hf.open_multidim_dataset(filepath, dataset)
+                if handle is None:
+                    continue
+            valid = handle_modules[i].checkFileSupported(filepath, handle)
+            if valid:
+                usedModule = handle_modules[i]
+                dataset = handle
+                logger.info("{} is being used to inspect {} file".format(usedModule.get_handler_name(), filepath))
+                break
 
     # If file format is not supported
     if not usedModule:
         logger.info("Did not find a compatible module for file format {} of file {}".format(file_format, filepath))
         return None
 
+    if usedModule.get_handler_name() == 'handleCSV':
+        # handleCSV does not read through GDAL, the threads share a single pass over the file instead
+        dataset = handleCSV.CSVScan(filepath, bbox=bbox, tbox=tbox, num_sample=num_sample)
+
+    # GDAL handles are not thread-safe, so the bbox and tbox threads take turns on the shared handle
+    lock = threading.Lock()
+
     # get Bbox, Temporal Extent, Vector representation and crs parallel with threads
     class thread(threading.Thread):
         def __init__(self, task):
@@ -200,13 +509,12 @@ def fromFile(filepath, bbox=True, tbox=True, num_sample=None):
             metadata["format"] = file_format
             metadata["geoextent_handler"] = usedModule.get_handler_name()
 
-            # with lock:
-
             logger.debug("Starting  thread {} on file {}".format(self.task, filepath))
             if self.task == "bbox":
                 try:
                     if bbox:
-                        spatial_extent = compute_bbox_wgs84(usedModule, filepath)
+                        with lock:
+                            spatial_extent = compute_bbox_wgs84(usedModule, filepath, dataset)
                         if spatial_extent is not None:
                             metadata["bbox"] = spatial_extent['bbox']
                             metadata["crs"] = spatial_extent['crs']
@@ -216,11 +524,13 @@ def fromFile(filepath, bbox=True, tbox=True, num_sample=None):
                 try:
                     if tbox:
                         if usedModule.get_handler_name() == 'handleCSV':
-                            extract_tbox = usedModule.getTemporalExtent(filepath, num_sample)
+                            with lock:
+                                extract_tbox = usedModule.getTemporalExtent(filepath, num_sample, dataset=dataset)
                         else:
                             if num_sample is not None:
                                 logger.warning("num_sample parameter is ignored, only applies to CSV files")
-                            extract_tbox = usedModule.getTemporalExtent(filepath)
+                            with lock:
+                                extract_tbox = usedModule.getTemporalExtent(filepath, dataset)
                         if extract_tbox is not None:
                             metadata["tbox"] = extract_tbox
                 except Exception as e:
@@ -252,10 +562,27 @@ def from_repository(
     details: bool = False,
     throttle: bool = False,
     timeout: None | int | float = None,
+    workers: None | int = None,
+    download_workers: None | int = None,
+    doi_cache=None,
+    pipeline: bool = False,
+    remote: bool = False,
+    download_store=None,
+    metadata_first: bool = False,
+    metadata_only_above: None | int = None,
+    skip_unsupported: bool = False,
+    max_file_size: None | int = None,
+    max_record_size: None | int = None,
 ):
     try:
         geoextent = geoextent_from_repository()
-        metadata = geoextent.from_repository(repository_identifier, bbox, tbox, details, throttle, timeout)
+        if download_workers is not None:
+            geoextent.download_workers = download_workers
+        geoextent.doi_cache = doi_cache
+        geoextent.download_store = download_store
+        metadata = geoextent.from_repository(repository_identifier, bbox, tbox, details, throttle, timeout, workers,
+                                             pipeline, remote, metadata_first, metadata_only_above, skip_unsupported,
+                                             max_file_size, max_record_size)
         metadata['format'] = 'repository'
     except ValueError as e:
         logger.debug("Error while inspecting repository {}: {}".format(repository_identifier, e))
@@ -264,6 +591,77 @@ def from_repository(
     return metadata
 
 
+def from_repositories(
+    repository_identifiers,
+    bbox: bool = False,
+    tbox: bool = False,
+    details: bool = False,
+    throttle: bool = False,
+    timeout: None | int | float = None,
+    record_workers: int = 4,
+    download_workers: None | int = None,
+    doi_cache=None,
+    download_store=None,
+    **options,
+):
+    """Extracts geoextent from several repository records, record_workers records at a time
+    Keyword arguments:
+    repository_identifiers -- iterable of DOIs or links of repository records
+    record_workers -- number of records inspected concurrently, the providers of a host share one
+                      connection pool and one rate limit (default 4); at most RECORDS_IN_FLIGHT_PER_WORKER times
+                      as many identifiers are taken from repository_identifiers ahead of the records yielded
+    options -- further keyword arguments of geoextent_from_repository.from_repository, e.g. pipeline
+    Yields one record per identifier as soon as it is done, type dict, with the keys
+    identifier -- the repository identifier
+    metadata -- result as of from_repository, None on error
+    error -- error message, None on success
+    """
+    if not bbox and not tbox:
+        logger.error("Require at least one of extraction options, but bbox is {} and tbox is {}".format(bbox, tbox))
+        raise Exception("No extraction options enabled!")
+
+    geoextent = geoextent_from_repository()
+    if download_workers is not None:
+        geoextent.download_workers = download_workers
+    geoextent.record_workers = record_workers
+    geoextent.doi_cache = doi_cache
+    geoextent.download_store = download_store
+
+    identifiers = iter(repository_identifiers)
+    futures = {}
+
+    def submit():
+        # only a bounded window of records is submitted, the identifiers are consumed as records complete
+        window = RECORDS_IN_FLIGHT_PER_WORKER * record_workers - len(futures)
+        for identifier in itertools.islice(identifiers, max(window, 0)):
+            futures[executor.submit(geoextent.from_repository, identifier, bbox, tbox, details, throttle, timeout,
+                                    **options)] = identifier
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=record_workers)
+    try:
+        submit()
+        while futures:
+            future = next(iter(concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)[0]))
+            identifier = futures.pop(future)
+            submit()
+            try:
+                metadata = future.result()
+            except Exception as e:
+                logger.warning("Error while inspecting repository {}: {}".format(identifier, e))
+                yield {"identifier": identifier, "metadata": None, "error": str(e)}
+                continue
+
+            if metadata is None:
+                yield {"identifier": identifier, "metadata": None,
+                       "error": "Geoextent can not handle this repository identifier"}
+            else:
+                metadata['format'] = 'repository'
+                yield {"identifier": identifier, "metadata": metadata, "error": None}
+    finally:
+        # when the caller stops early, do not start the remaining records
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 class geoextent_from_repository(Application):
     content_providers = List([Dryad.Dryad, Figshare.Figshare, Zenodo.Zenodo], config=True, help="""
         Ordered list by priority of ContentProviders to try in turn to fetch
@@ -271,23 +669,113 @@ class geoextent_from_repository(Application):
         """
                              )
 
-    def from_repository(self, repository_identifier, bbox=False, tbox=False, details=False, throttle=False, timeout=None):
+    download_workers = Int(DEFAULT_DOWNLOAD_WORKERS, config=True, help="""
+        Maximum number of files of a repository record downloaded concurrently.
+        """
+                           )
+
+    record_workers = Int(1, config=True, help="""
+        Number of repository records inspected concurrently by from_repositories.
+        """
+                         )
+
+    # requests Sessions shared by the providers of a host, by provider name
+    sessions = None
+    _sessions_lock = threading.Lock()
+
+    # DoiCache keeping resolved DOIs on disk, or None
+    doi_cache = None
+
+    # DOIs resolved by the providers of this application, i.e. of one from_repository call or
+    # from_repositories session, lowercase DOI -> URL
+    resolved_dois = None
+
+    # DownloadStore keeping downloaded files across runs, or None
+    download_store = None
+
+    def _session(self, name):
+        with self._sessions_lock:
+            if self.sessions is None:
+                self.sessions = {}
+            if name not in self.sessions:
+                self.sessions[name] = pooled_session(self.download_workers * self.record_workers)
+            return self.sessions[name]
+
+    def from_repository(self, repository_identifier, bbox=False, tbox=False, details=False, throttle=False, timeout=None,
+                        workers=None, pipeline=False, remote=False, metadata_first=False, metadata_only_above=None,
+                        skip_unsupported=False, max_file_size=None, max_record_size=None):
+        """Downloads a repository record and extracts its geoextent
+        pipeline -- extract every file as soon as it is downloaded and delete it afterwards, instead of
+                    extracting the whole record once it is downloaded (default False)
+        remote -- read files of the REMOTE_FORMATS with HTTP range requests instead of downloading them,
+                  files GDAL cannot read remotely are downloaded (default False)
+        metadata_first -- return the extent the record declares in its metadata without downloading files, if it
+                          declares all requested extents (default False)
+        metadata_only_above -- size of a record in bytes above which only the extent declared in its metadata is
+                               returned, even if incomplete (default None)
+        Results taken from the metadata of the record have extent_source 'metadata'.
+        skip_unsupported -- do not download files of formats geoextent does not support (default False)
+        max_file_size -- do not download files larger than this many bytes (default None)
+        max_record_size -- download at most this many bytes of the record (default None)
+        Files not downloaded because of these options are listed in skipped_files.
+        """
 
         if bbox + tbox == 0:
             logger.error("Require at least one of extraction options, but bbox is {} and tbox is {}".format(bbox, tbox))
             raise Exception("No extraction options enabled!")
 
+        # resolve a DOI once, the providers are chosen by the resolved URL
+        resolver = DoiProvider()
+        resolver.session = self._session("doi.org")
+        resolver.doi_cache = self.doi_cache
+        with self._sessions_lock:
+            if self.resolved_dois is None:
+                self.resolved_dois = {}
+        resolver.resolved_dois = self.resolved_dois
+        url = resolver.resolve(repository_identifier)
+
         for h in self.content_providers:
             repository = h()
+            repository.session = self._session(repository.name)
+            repository.download_workers = self.download_workers
+            repository.doi_cache = self.doi_cache
+            repository.resolved_dois = self.resolved_dois
+            repository.download_store = self.download_store
+            repository.skip_unsupported = skip_unsupported
+            repository.max_file_size = max_file_size
+            repository.max_record_size = max_record_size
             supported_by_geoextent = False
-            if repository.validate_provider(reference=repository_identifier):
+            if repository.validate_provider(reference=repository_identifier, url=url):
                 logger.debug("Using {} to extract {}".format(repository.name, repository_identifier))
                 supported_by_geoextent = True
+
+                if metadata_first or metadata_only_above is not None:
+                    metadata = _fromDeclaredExtent(repository, bbox, tbox, details, metadata_first,
+                                                   metadata_only_above)
+                    if metadata is not None:
+                        return metadata
+
                 try:
-                    tmp_parent = "/run/media/lars/8f0c1f09-2c90-4cb3-ac63-19295ea5ede3/tmp2"
-                    with tempfile.TemporaryDirectory(dir=tmp_parent) as tmp:
-                        repository.download(tmp, throttle)
-                        metadata = fromDirectory(tmp, bbox, tbox, details, timeout)
+                    with tempfile.TemporaryDirectory() as tmp:
+                        if pipeline:
+                            metadata = _fromDownloads(repository, tmp, bbox, tbox, details, throttle, timeout,
+                                                      workers, remote)
+                        else:
+                            metadata_remote = {}
+                            if remote:
+                                repository.remote_reader = _remote_reader(tmp, bbox, tbox, metadata_remote)
+                            repository.download(tmp, throttle)
+                            metadata = fromDirectory(tmp, bbox, tbox, details or bool(metadata_remote), timeout,
+                                                     workers=workers)
+                            if metadata_remote:
+                                metadata_directory = {**metadata.pop("details"), **metadata_remote}
+                                metadata_merged = _summarize_directory(metadata_directory, tmp, 'folder', bbox, tbox,
+                                                                       details)
+                                if "timeout" in metadata:
+                                    metadata_merged["timeout"] = metadata["timeout"]
+                                metadata = metadata_merged
+                    if repository.skipped_files:
+                        metadata['skipped_files'] = repository.skipped_files
                     return metadata
                 except ValueError as e:
                     raise Exception(e)
@@ -295,3 +783,126 @@ class geoextent_from_repository(Application):
                 logger.error("Geoextent can not handle this repository identifier {}"
                                  "\n Check for typos or if the repository exists. ".format(repository_identifier)
                             )
+
+
+def _fromDeclaredExtent(repository, bbox, tbox, details=False, metadata_first=False, metadata_only_above=None):
+    """Extracts geoextent from the extent a repository record declares in its metadata
+    Keyword arguments:
+    repository -- validated content provider
+    metadata_first -- use the declared extent if it has all requested extents
+    metadata_only_above -- use the declared extent, even if incomplete, for records larger than this many bytes
+    returns None if the files of the record have to be downloaded
+    """
+    try:
+        declared = repository.get_declared_extent() or {}
+        size = repository.get_record_size() if metadata_only_above is not None else None
+    except Exception as e:
+        logger.warning("Could not read the extent declared in the metadata of {}: {}".format(repository.name, e))
+        return None
+
+    complete = (not bbox or 'bbox' in declared) and (not tbox or 'tbox' in declared)
+    too_large = size is not None and size > metadata_only_above
+    if not (metadata_first and complete) and not too_large:
+        return None
+
+    if too_large and not complete:
+        logger.warning("The record has {} bytes, more than {}: returning the incomplete extent declared in its metadata"
+                       " instead of downloading it".format(size, metadata_only_above))
+
+    metadata = {'extent_source': 'metadata'}
+    if bbox and 'bbox' in declared:
+        metadata['crs'] = declared['crs']
+        metadata['bbox'] = declared['bbox']
+    if tbox and 'tbox' in declared:
+        metadata['tbox'] = declared['tbox']
+    if details:
+        # no files were inspected
+        metadata['details'] = {}
+    return metadata
+
+
+def _fromDownloads(repository, folder, bbox, tbox, details, throttle=False, timeout=None, workers=None, remote=False):
+    """Extracts geoextent from the files of a repository record while it is downloaded
+    Keyword arguments:
+    repository -- validated content provider
+    folder -- directory the files are downloaded to, each file is deleted once it is extracted
+    timeout -- maximal allowed run time in seconds, the download stops when it is reached (default None)
+    workers -- number of processes extracting the files of archives in parallel (default None)
+    remote -- read files of the REMOTE_FORMATS with HTTP range requests instead of downloading them (default False)
+    """
+    metadata_directory = {}
+    timeout_flag = False
+    start_time = time.time()
+
+    if remote:
+        repository.remote_reader = _remote_reader(folder, bbox, tbox, metadata_directory)
+
+    def extract(filepaths):
+        nonlocal timeout_flag
+        for filepath in filepaths:
+            filename = os.path.relpath(filepath, folder)
+            remaining_time = timeout - (time.time() - start_time) if timeout else None
+            if timeout and remaining_time <= 0:
+                timeout_flag = True
+                break
+
+            if patoolib.is_archive(filepath):
+                metadata_directory[filename] = fromDirectory(str(filepath), bbox, tbox, details=True,
+                                                             timeout=remaining_time, workers=workers)
+                metadata_directory[filename]['format'] = 'archive'
+            else:
+                metadata_directory[filename] = fromFile(str(filepath), bbox, tbox)
+
+        for filepath in filepaths:
+            os.remove(filepath)
+
+        return not timeout_flag
+
+    repository.download(folder, throttle, on_download=extract)
+
+    metadata = _summarize_directory(metadata_directory, folder, 'folder', bbox, tbox, details)
+
+    if timeout_flag:
+        logger.warning(f"Timeout reached after {timeout} seconds, returning partial results.")
+        metadata["timeout"] = timeout
+
+    return metadata
+
+
+def fromRemoteFile(url, bbox=True, tbox=True):
+    """ Extracts geoextent from a file on a web server with HTTP range requests, without downloading it
+    Keyword arguments:
+    url -- URL of the file, the server must support range requests
+    bbox -- True if bounding box is requested (default True)
+    tbox -- True if time box is requested (default True)
+    returns None if GDAL cannot read the file remotely
+    """
+    # do not let GDAL probe the server for companion files, repository URLs are no directory listings
+    gdal.SetThreadLocalConfigOption("GDAL_DISABLE_READDIR_ON_OPEN", "EMPTY_DIR")
+    try:
+        return fromFile("/vsicurl/" + url, bbox, tbox)
+    finally:
+        gdal.SetThreadLocalConfigOption("GDAL_DISABLE_READDIR_ON_OPEN", None)
+
+
+def _remote_reader(folder, bbox, tbox, metadata_directory):
+    """Creates the remote_reader of a content provider, which reads files of the REMOTE_FORMATS with fromRemoteFile
+    Keyword arguments:
+    folder -- directory the files would be downloaded to
+    metadata_directory -- dict the results are stored in, by the path of the file relative to folder
+    """
+    def read(url, filepath):
+        file_format = os.path.splitext(filepath)[1][1:]
+        if file_format.lower() not in REMOTE_FORMATS:
+            return False
+
+        metadata_file = fromRemoteFile(url, bbox, tbox)
+        if metadata_file is None:
+            logger.info("Could not read {} remotely, downloading it".format(url))
+            return False
+
+        metadata_file["format"] = file_format
+        metadata_directory[os.path.relpath(filepath, folder)] = metadata_file
+        return True
+
+    return read
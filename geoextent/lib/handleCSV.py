@@ -1,28 +1,33 @@
 import csv
 import logging
-from osgeo import gdal
+import re
+import threading
+import pandas as pd
 from . import helpfunctions as hf
 
 logger = logging.getLogger("geoextent")
 
 search = {"longitude": ["(.)*longitude", "(.)*long(.)*", "^lon", "lon$", "(.)*lng(.)*", "^x", "x$"],
           "latitude": ["(.)*latitude(.)*", "^lat", "lat$", "^y", "y$"],
-          "time": ["(.)*timestamp(.)*", "(.)*datetime(.)*", "(.)*time(.)*", "date$", "^date"]}
+          "time": ["(.)*timestamp(.)*", "(.)*datetime(.)*", "(.)*time(.)*", "date$", "^date"],
+          "crs": ["crs", "srsID", "EPSG"]}
 
 
 def get_handler_name():
     return "handleCSV"
 
 
-def checkFileSupported(filepath):
+def checkFileSupported(filepath, dataset=None):
     '''Checks whether it is valid CSV or not. \n
     input "path": type string, path to file which shall be extracted \n
+    input "dataset": type gdal.Dataset, already opened handle of the file (optional) \n
     raise exception if not valid
     '''
 
     try:
-        file = gdal.OpenEx(filepath)
-        driver = file.GetDriver().ShortName
+        if dataset is None:
+            dataset = hf.open_dataset(filepath)
+        driver = dataset.GetDriver().ShortName
     except Exception:
         logger.debug("File {} is NOT supported by HandleCSV module".format(filepath))
         return False
@@ -56,138 +61,239 @@ def checkFileSupported(filepath):
         return False
 
 
-def getBoundingBox(filePath, chunk_size=50000):
+class CSVScan:
+    '''Reads a csv file once and collects what getBoundingBox, getCRS and getTemporalExtent need: \n
+    minimum and maximum of the coordinate columns, the values of the CRS columns and minimum and maximum time.
+    Only one chunk of the file is held in memory. The time columns are chosen from the first chunk in which their
+    values have a recognizable time format, the time format is inferred from that chunk (num_sample as in
+    hf.date_parser) and every chunk is parsed with it. A column whose values in a chunk do not match the format
+    at all, e.g. after a change of the format further down the file, has the format inferred again from that chunk.
+    extent.fromFile shares one scan between its bbox and tbox threads, the first call of run() reads the file.
+    '''
+
+    def __init__(self, filepath, bbox=True, tbox=True, chunk_size=50000, num_sample=None):
+        self.filepath = filepath
+        self.bbox = bbox
+        self.tbox = tbox
+        self.chunk_size = chunk_size
+        self.num_sample = num_sample
+        self.header = []
+        self.lat_columns = []
+        self.lon_columns = []
+        self.crs_columns = []
+        self.time_columns = []
+        # column index -> (min, max)
+        self.columns_extent = {}
+        self.crs_values = set()
+        # matched time columns with a recognizable time format, see getColumnGroups
+        self.time_groups = []
+        self.time_format = None
+        self.time_error = None
+        self.time_min = None
+        self.time_max = None
+        self._lock = threading.Lock()
+        self._done = False
+
+    def run(self):
+        with self._lock:
+            if not self._done:
+                self._scan()
+                self._done = True
+        return self
+
+    def _scan(self):
+        with open(self.filepath) as csv_file:
+            delimiter = hf.getDelimiter(csv_file)
+            self.header = next(csv.reader(csv_file, delimiter=delimiter))
+
+        # resolve the columns once from the header, then only read those columns
+        if self.bbox:
+            self.lat_columns = getColumns(self.header, search['latitude'])
+            self.lon_columns = getColumns(self.header, search['longitude'])
+            self.crs_columns = getColumns(self.header, search['crs'])
+        if self.tbox:
+            self.time_columns = getColumns(self.header, search['time'])
+
+        columns = sorted(set(self.lat_columns + self.lon_columns + self.crs_columns + self.time_columns))
+        if not columns:
+            return
+
+        chunks = pd.read_csv(self.filepath, sep=delimiter, header=0, usecols=columns, dtype=str,
+                             keep_default_na=False, chunksize=self.chunk_size, on_bad_lines='skip')
+        for chunk in chunks:
+            # read_csv keeps the columns in file order, label them with their index
+            chunk.columns = columns
+            for i in set(self.lat_columns + self.lon_columns):
+                self._update_extent(i, chunk[i])
+            for i in self.crs_columns:
+                self.crs_values.update(chunk[i].dropna().str.replace(" ", ""))
+            if self.time_columns:
+                self._update_time_extent(chunk)
+
+    def _update_time_extent(self, chunk):
+        values = {i: chunk[i].dropna().str.replace(" ", "") for i in self.time_columns}
+        values = {i: column_values[column_values != ""] for i, column_values in values.items()}
+
+        # like hf.searchForParameters keep the matched columns with a recognizable time format, columns without
+        # values in the first chunks are chosen from the first chunk that has some
+        sample = []
+        for group in getColumnGroups(self.header, search['time']):
+            if group in self.time_groups:
+                continue
+            group_values = sum([values[i].tolist() for i in group], [])
+            if hf.get_time_format(group_values, 30) is not None:
+                self.time_groups.append(group)
+                sample.extend(group_values)
+
+        if self.time_format is None and sample and self.time_error is None:
+            # infer one format for all of them like hf.date_parser
+            try:
+                self.time_format = hf.get_time_format(sample, self.num_sample)
+            except Exception as e:
+                # raised by getTemporalExtent, the bbox thread may be the one running the scan
+                self.time_error = e
+
+        if self.time_format is None:
+            return
+
+        for i in set(sum(self.time_groups, [])):
+            if values[i].empty:
+                continue
+            parsed_time = pd.to_datetime(values[i], format=self.time_format, errors='coerce').dropna()
+            if parsed_time.empty:
+                # the time format changed further down the file, infer it again from this chunk
+                time_format = hf.get_time_format(values[i].tolist(), self.num_sample)
+                if time_format is None:
+                    logger.debug("{}: no time format found for column {} in rows beyond the first chunk"
+                                 .format(self.filepath, self.header[i]))
+                    continue
+                logger.debug("{}: time format of column {} changed from {} to {}"
+                             .format(self.filepath, self.header[i], self.time_format, time_format))
+                self.time_format = time_format
+                parsed_time = pd.to_datetime(values[i], format=self.time_format, errors='coerce').dropna()
+            if parsed_time.empty:
+                continue
+            if self.time_min is None or parsed_time.min() < self.time_min:
+                self.time_min = parsed_time.min()
+            if self.time_max is None or parsed_time.max() > self.time_max:
+                self.time_max = parsed_time.max()
+
+    def _update_extent(self, column, values):
+        try:
+            values = values.astype(float)
+        except ValueError:
+            values = pd.to_numeric(values.str.replace(" ", ""), errors='coerce')
+        # like hf.getAllRowElements, zero values are discarded
+        values = values[values != 0].dropna()
+        if values.empty:
+            return
+        column_min, column_max = float(values.min()), float(values.max())
+        if column in self.columns_extent:
+            column_min = min(column_min, self.columns_extent[column][0])
+            column_max = max(column_max, self.columns_extent[column][1])
+        self.columns_extent[column] = (column_min, column_max)
+
+
+def getColumnGroups(header, param_array):
+    '''
+    Function purpose: resolves the columns hf.searchForParameters takes values from \n
+    input "header": type list, first row of the csv file \n
+    input "param_array": type list, regular expressions matched against the column names \n
+    returns one list of column indices per matched column name: like hf.getAllRowElements,
+    every column containing the matched name is used
+    '''
+    groups = []
+    for x in param_array:
+        p = re.compile(x, re.IGNORECASE)
+        for name in header:
+            if p.search(name) is not None:
+                groups.append([i for i, val in enumerate(header) if name in val])
+    return groups
+
+
+def getColumns(header, param_array):
+    '''
+    Function purpose: indices of all columns matching param_array, see getColumnGroups \n
+    returns type list
+    '''
+    columns = []
+    for group in getColumnGroups(header, param_array):
+        columns.extend(i for i in group if i not in columns)
+    return columns
+
+
+def getBoundingBox(filePath, chunk_size=50000, dataset=None):
     '''
     Function purpose: extracts the spatial extent (bounding box) from a csv-file \n
     input "filepath": type string, file path to csv file \n
+    input "dataset": type CSVScan, scan of the file shared with getTemporalExtent (optional) \n
     returns spatialExtent: type list, length = 4 , type = float, schema = [min(longs), min(lats), max(longs), max(lats)] 
     '''
 
-    with open(filePath) as csv_file:
-        delimiter = hf.getDelimiter(csv_file)
-        data = csv.reader(csv_file, delimiter=delimiter)
-
-        header = next(data)
-        chunk = [header]
-
-        spatial_extent = {
-            "min_lat": [],
-            "max_lat": [],
-            "min_lon": [],
-            "max_lon": [],
-        }
-
-        for x in data:
-            chunk.append(x)
-            if len(chunk) >= chunk_size:
-                spatial_lat_extent = hf.searchForParameters(chunk, search['latitude'], exp_data='numeric')
-                spatial_lon_extent = hf.searchForParameters(chunk, search['longitude'], exp_data='numeric')
-
-                if not spatial_lat_extent and not spatial_lon_extent:
-                    raise Exception('The csv file from ' + filePath + ' has no BoundingBox')
-                else:
-                    spatial_extent["min_lat"].append(min(spatial_lat_extent))
-                    spatial_extent["max_lat"].append(max(spatial_lat_extent))
-                    spatial_extent["min_lon"].append(min(spatial_lon_extent))
-                    spatial_extent["max_lon"].append(max(spatial_lon_extent))
-
-                chunk = [header]
-
-        if len(chunk) > 1:
-            spatial_lat_extent = hf.searchForParameters(chunk, search['latitude'], exp_data='numeric')
-            spatial_lon_extent = hf.searchForParameters(chunk, search['longitude'], exp_data='numeric')
-
-            if not spatial_lat_extent and not spatial_lon_extent:
-                raise Exception('The csv file from ' + filePath + ' has no BoundingBox')
-            else:
-                spatial_extent["min_lat"].append(min(spatial_lat_extent))
-                spatial_extent["max_lat"].append(max(spatial_lat_extent))
-                spatial_extent["min_lon"].append(min(spatial_lon_extent))
-                spatial_extent["max_lon"].append(max(spatial_lon_extent))
-
-        bbox = [
-            min(spatial_extent["min_lon"]),
-            min(spatial_extent["min_lat"]),
-            max(spatial_extent["max_lon"]),
-            max(spatial_extent["max_lat"]),
-        ]
-
-        logger.debug("Extracted Bounding box (without projection): {}".format(bbox))
-        crs = getCRS(filePath, chunk_size)
-        logger.debug("Extracted CRS: {}".format(crs))
-        spatialExtent = {"bbox": bbox, "crs": crs}
-        if not bbox or not crs:
-            raise Exception("Bounding box could not be extracted")
+    scan = dataset if dataset is not None else CSVScan(filePath, bbox=True, tbox=False, chunk_size=chunk_size)
+    scan.run()
+
+    lat_extent = [scan.columns_extent[i] for i in scan.lat_columns if i in scan.columns_extent]
+    lon_extent = [scan.columns_extent[i] for i in scan.lon_columns if i in scan.columns_extent]
+    if not lat_extent or not lon_extent:
+        raise Exception('The csv file from ' + filePath + ' has no BoundingBox')
+
+    bbox = [
+        min(e[0] for e in lon_extent),
+        min(e[0] for e in lat_extent),
+        max(e[1] for e in lon_extent),
+        max(e[1] for e in lat_extent),
+    ]
+
+    logger.debug("Extracted Bounding box (without projection): {}".format(bbox))
+    crs = getCRS(filePath, chunk_size, dataset=scan)
+    logger.debug("Extracted CRS: {}".format(crs))
+    spatialExtent = {"bbox": bbox, "crs": crs}
+    if not bbox or not crs:
+        raise Exception("Bounding box could not be extracted")
 
     return spatialExtent
 
 
-def getTemporalExtent(filepath, num_sample):
+def getTemporalExtent(filepath, num_sample, dataset=None):
     """ extract time extent from csv string \n
     input "filePath": type string, file path to csv File \n
+    input "dataset": type CSVScan, scan of the file shared with getBoundingBox (optional) \n
     returns temporal extent of the file: type list, length = 2, both entries have the type str, temporalExtent[0] <= temporalExtent[1]
     """
 
-    with open(filepath) as csv_file:
-        delimiter = hf.getDelimiter(csv_file)
-        data = csv.reader(csv_file, delimiter=delimiter)
-
-        elements = []
-        for x in data:
-            elements.append(x)
-
-        all_temporal_extent = hf.searchForParameters(elements, search['time'], exp_data="time")
-        if all_temporal_extent is None:
-            raise Exception('The csv file from ' + filepath + ' has no TemporalExtent')
-        else:
-            tbox = []
-            parsed_time = hf.date_parser(all_temporal_extent, num_sample=num_sample)
-
-            if parsed_time is not None:
-                # Min and max into ISO8601 format ('%Y-%m-%d')
-                tbox.append(min(parsed_time).strftime('%Y-%m-%d'))
-                tbox.append(max(parsed_time).strftime('%Y-%m-%d'))
-            else:
-                raise Exception('The csv file from ' + filepath + ' has no recognizable TemporalExtent')
-            return tbox
+    scan = dataset if dataset is not None else CSVScan(filepath, bbox=False, tbox=True, num_sample=num_sample)
+    scan.run()
+
+    if scan.time_error is not None:
+        raise scan.time_error
+    if not scan.time_groups:
+        raise Exception('The csv file from ' + filepath + ' has no TemporalExtent')
+    if scan.time_min is None:
+        raise Exception('The csv file from ' + filepath + ' has no recognizable TemporalExtent')
+
+    # Min and max into ISO8601 format ('%Y-%m-%d')
+    tbox = [scan.time_min.strftime('%Y-%m-%d'), scan.time_max.strftime('%Y-%m-%d')]
+    return tbox
 
 
-def getCRS(filepath, chunk_size=50000):
+def getCRS(filepath, chunk_size=50000, dataset=None):
     '''extracts coordinatesystem from csv File \n
     input "filepath": type string, file path to csv file \n
+    input "dataset": type CSVScan, scan of the file (optional) \n
     returns the epsg code of the used coordinate reference system, type list, contains extracted coordinate system of content from csv file
     '''
 
-    with open(filepath) as csv_file:
-        delimiter = hf.getDelimiter(csv_file)
-        data = csv.reader(csv_file, delimiter=delimiter)
+    scan = dataset if dataset is not None else CSVScan(filepath, bbox=True, tbox=False, chunk_size=chunk_size)
+    crs = scan.run().crs_values
 
-        header = next(data)
-        chunk = [header]
-
-        crs = []
-
-        for x in data:
-            chunk.append(x)
-            if len(chunk) >= chunk_size:
-                param = hf.searchForParameters(chunk, ["crs", "srsID", "EPSG"])
-                if param:
-                    crs.extend(param)
-
-                chunk = [header]
-
-        if len(chunk) > 1:
-            param = hf.searchForParameters(chunk, ["crs", "srsID", "EPSG"])
-            if param:
-                crs.extend(param)
-
-        if not crs:
-            logger.debug("{} : There is no identifiable coordinate reference system. We will try to use EPSG: 4326".format(filepath))
-            crs = "4326"
-        elif len(list(set(crs))) > 1:
-            logger.debug("{} : Coordinate reference system of the file is ambiguous. Extraction is not possible.".format(filepath))
-            raise Exception('The csv file from ' + filepath + ' has no CRS')
-        else:
-            crs = str(list(set(crs))[0])
+    if not crs:
+        logger.debug("{} : There is no identifiable coordinate reference system. We will try to use EPSG: 4326".format(filepath))
+        crs = "4326"
+    elif len(crs) > 1:
+        logger.debug("{} : Coordinate reference system of the file is ambiguous. Extraction is not possible.".format(filepath))
+        raise Exception('The csv file from ' + filepath + ' has no CRS')
+    else:
+        crs = str(list(crs)[0])
 
-        return crs
+    return crs
@@ -0,0 +1,129 @@
+import logging
+import numpy as np
+from . import helpfunctions as hf
+
+logger = logging.getLogger("geoextent")
+
+LONGITUDE_NAMES = {"lon", "longitude"}
+LATITUDE_NAMES = {"lat", "latitude"}
+
+
+def get_handler_name():
+    return "handleMultidim"
+
+
+def _attribute(variable, name):
+    attribute = variable.GetAttribute(name)
+    return attribute.ReadAsString() if attribute is not None else None
+
+
+def _coordinate_axis(dimension, variable):
+    """ tells whether a coordinate variable holds longitudes or latitudes, from its name, standard_name or units \n
+    returns "longitude", "latitude" or None
+    """
+    name = dimension.GetName().lower()
+    standard_name = (_attribute(variable, "standard_name") or "").lower()
+    units = (variable.GetUnit() or _attribute(variable, "units") or "").lower()
+
+    if name in LONGITUDE_NAMES or standard_name == "longitude" or units.startswith("degrees_e"):
+        return "longitude"
+    if name in LATITUDE_NAMES or standard_name == "latitude" or units.startswith("degrees_n"):
+        return "latitude"
+    return None
+
+
+def _groups(group):
+    yield group
+    for name in group.GetGroupNames() or []:
+        yield from _groups(group.OpenGroup(name))
+
+
+def _coordinates(dataset):
+    """ finds the 1D longitude and latitude coordinate variables of a dataset opened with gdal.OF_MULTIDIM_RASTER \n
+    returns dict with the keys "longitude" and "latitude", type gdal.MDArray, None if the dataset has none
+    """
+    for group in _groups(dataset.GetRootGroup()):
+        coordinates = {}
+        for dimension in group.GetDimensions() or []:
+            variable = dimension.GetIndexingVariable()
+            if variable is None or variable.GetDimensionCount() != 1:
+                continue
+            axis = _coordinate_axis(dimension, variable)
+            if axis is not None and axis not in coordinates:
+                coordinates[axis] = variable
+        if len(coordinates) == 2:
+            return coordinates
+    return None
+
+
+def _cell_edges(variable):
+    """ reads a coordinate variable, the coordinates of cell centers, and returns the outer cell edges \n
+    returns (min, max), type float
+    """
+    values = np.asarray(variable.ReadAsArray(), dtype=float)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        raise Exception("Coordinate variable {} has no values".format(variable.GetName()))
+    half_cell = abs(values[1] - values[0]) / 2 if len(values) > 1 else 0
+    return float(values.min() - half_cell), float(values.max() + half_cell)
+
+
+def checkFileSupported(filepath, dataset=None):
+    '''Checks whether the file is a gridded dataset with longitude and latitude coordinate variables. \n
+    input "path": type string, path to file or Zarr store which shall be extracted \n
+    input "dataset": type gdal.Dataset, handle of the file already opened with gdal.OF_MULTIDIM_RASTER, see
+    hf.open_multidim_dataset (optional) \n
+    raise exception if not valid
+    '''
+    if dataset is None:
+        dataset = hf.open_multidim_dataset(filepath)
+
+    if dataset is None or _coordinates(dataset) is None:
+        logger.debug("File {} is NOT supported by handleMultidim module".format(filepath))
+        return False
+
+    logger.debug("File {} is supported by handleMultidim module".format(filepath))
+    return True
+
+
+def getBoundingBox(filepath, dataset=None):
+    """ extracts bounding box from the coordinate variables of a gridded dataset, without reading its data \n
+    input "filepath": type string, file path to file or Zarr store \n
+    input "dataset": type gdal.Dataset, handle of the file already opened with gdal.OF_MULTIDIM_RASTER (optional) \n
+    returns bounding box of the file: type list, length = 4 , type = float, schema = [min(longs), min(lats), max(longs), max(lats)]
+    """
+    if dataset is None:
+        dataset = hf.open_multidim_dataset(filepath)
+    coordinates = _coordinates(dataset)
+    min_lon, max_lon = _cell_edges(coordinates["longitude"])
+    min_lat, max_lat = _cell_edges(coordinates["latitude"])
+
+    # longitudes from 0 to 360
+    if max_lon > 180:
+        if min_lon >= 180:
+            min_lon, max_lon = min_lon - 360, max_lon - 360
+        else:
+            min_lon, max_lon = -180.0, 180.0
+
+    # the cells of global grids with coordinates at the poles or the antimeridian end beyond them
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+
+    return {"bbox": [min_lon, min_lat, max_lon, max_lat], "crs": str(hf.WGS84_EPSG_ID)}
+
+
+def getTemporalExtent(filepath, dataset=None):
+    """ extracts temporal extent from the time coordinate variables of a gridded dataset \n
+    input "filepath": type string, file path to file or Zarr store \n
+    input "dataset": type gdal.Dataset, handle of the file already opened with gdal.OF_MULTIDIM_RASTER (optional) \n
+    returns temporal extent of the file: type list, length = 2, type = string, schema = [min(dates), max(dates)]
+    """
+    if dataset is None:
+        dataset = hf.open_multidim_dataset(filepath)
+    times = hf.multidim_times(dataset.GetRootGroup())
+
+    if len(times) == 0:
+        logger.debug('{} There is no time coordinate variable in the dataset'.format(filepath))
+        return None
+
+    return [min(times).strftime(hf.output_time_format), max(times).strftime(hf.output_time_format)]
@@ -1,41 +1,168 @@
-import osgeo
+import concurrent.futures
 import osgeo.gdal as gdal
-import osgeo.osr as osr
 import logging
+import os
+import re
+import numpy as np
+import pandas as pd
 from . import helpfunctions as hf
 
 logger = logging.getLogger("geoextent")
 
+DEFAULT_EDGE_POINTS = 21
+
+
+def _edge_points_setting(value):
+    """ number of points per raster edge from the environment variable GEOEXTENT_RASTER_EDGE_POINTS \n
+    returns DEFAULT_EDGE_POINTS if the variable is not set, no integer or lower than 2
+    """
+    if value is None:
+        return DEFAULT_EDGE_POINTS
+    try:
+        edge_points = int(value)
+    except ValueError:
+        edge_points = 0
+    if edge_points < 2:
+        logger.warning("GEOEXTENT_RASTER_EDGE_POINTS={} is no integer of at least 2, using {}"
+                       .format(value, DEFAULT_EDGE_POINTS))
+        return DEFAULT_EDGE_POINTS
+    return edge_points
+
+
+# points per raster edge, including both corners, transformed to WGS84 by getBoundingBox: more points follow the
+# curved edges of rasters in polar, rotated or wide projected CRS more accurately, 2 only transforms the four
+# corners; an integer of at least 2 set with the environment variable GEOEXTENT_RASTER_EDGE_POINTS (default 21)
+EDGE_POINTS = _edge_points_setting(os.environ.get("GEOEXTENT_RASTER_EDGE_POINTS"))
+# number of subdatasets of netCDF/HDF containers read concurrently
+SUBDATASET_WORKERS = 4
+# only read the first georeferenced subdataset of a container, for containers whose subdatasets share one grid;
+# can be set with the environment variable GEOEXTENT_FIRST_SUBDATASET_ONLY=1
+FIRST_SUBDATASET_ONLY = os.environ.get("GEOEXTENT_FIRST_SUBDATASET_ONLY") == "1"
+netcdf_dim_regexp = re.compile(r"^NETCDF_DIM_(.+)_VALUES$")
+subdataset_name_regexp = re.compile(r"^SUBDATASET_(\d+)_NAME$")
+grib_time_regexp = re.compile(r"^\s*(-?\d+)")
+
 
 def get_handler_name():
     return "handleRaster"
 
 
-def checkFileSupported(filepath):
+def checkFileSupported(filepath, dataset=None):
     '''Checks whether it is valid raster file or not. \n
     input "path": type string, path to file which shall be extracted \n
+    input "dataset": type gdal.Dataset, already opened handle of the file (optional) \n
     raise exception if not valid
     '''
 
     logger.info(filepath)
     try:
-        file = gdal.OpenEx(filepath)
-        driver = file.GetDriver().ShortName
+        if dataset is None:
+            dataset = hf.open_dataset(filepath)
+        driver = dataset.GetDriver().ShortName
     except:
         logger.debug("File {} is NOT supported by handleRaster module".format(filepath))
         return False
 
-    if file.RasterCount > 0:
+    if dataset.RasterCount > 0:
         logger.debug("File {} is supported by handleRaster module".format(filepath))
         return True
+    elif dataset.GetLayerCount() == 0 and _subdataset_names(dataset):
+        # netCDF/HDF containers keep their data in subdatasets and have no bands themselves
+        logger.debug("File {} is supported by handleRaster module through its subdatasets".format(filepath))
+        return True
     else:
         logger.debug("File {} is NOT supported by handleRaster module".format(filepath))
         return False
 
 
-def getBoundingBox(filepath):
+def _subdataset_names(dataset):
+    """ names to open the subdatasets of a container with, in the order of the container \n
+    """
+    subdatasets = dataset.GetMetadata("SUBDATASETS") or {}
+    names = []
+    for key, value in subdatasets.items():
+        match = subdataset_name_regexp.match(key)
+        if match is not None:
+            names.append((int(match.group(1)), value))
+    return [name for number, name in sorted(names)]
+
+
+def _is_georeferenced(dataset):
+    geotransform = dataset.GetGeoTransform(can_return_null=True)
+    return geotransform is not None and tuple(geotransform) != (0, 1, 0, 0, 0, 1)
+
+
+def _map_subdatasets(dataset, extract, first_only=None):
+    """ applies extract to the georeferenced subdatasets of a container, concurrently \n
+    input "extract": type function, called with the name and the opened subdataset, returns None if the
+    subdataset has no result \n
+    input "first_only": type bool, stop after the first subdataset with a result (default FIRST_SUBDATASET_ONLY) \n
+    returns list of the results that are not None
+    """
+    first_only = FIRST_SUBDATASET_ONLY if first_only is None else first_only
+
+    def extract_subdataset(name):
+        try:
+            subdataset = gdal.Open(name)
+            if subdataset is None or not _is_georeferenced(subdataset):
+                logger.debug("Subdataset {} is not georeferenced".format(name))
+                return None
+            return extract(name, subdataset)
+        except Exception as e:
+            logger.debug("Error extracting subdataset {}: {}".format(name, e))
+            return None
+
+    names = _subdataset_names(dataset)
+    if first_only:
+        for name in names:
+            result = extract_subdataset(name)
+            if result is not None:
+                return [result]
+        return []
+
+    # every thread opens its own handle, GDAL handles must not be shared between threads
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SUBDATASET_WORKERS) as executor:
+        return [result for result in executor.map(extract_subdataset, names) if result is not None]
+
+
+def _edge_points(geotransform, width, height, edge_points):
+    """ points along the four edges of a raster in its CRS \n
+    input "geotransform": type tuple, geotransform of the raster \n
+    input "edge_points": type int, number of points per edge including the corners \n
+    returns numpy array, shape (4 * edge_points, 2)
+    """
+    edge = np.linspace(0, 1, edge_points)
+    columns = np.concatenate([edge * width, edge * width, np.zeros_like(edge), np.full_like(edge, width)])
+    rows = np.concatenate([np.zeros_like(edge), np.full_like(edge, height), edge * height, edge * height])
+    return np.column_stack([geotransform[0] + columns * geotransform[1] + rows * geotransform[2],
+                            geotransform[3] + columns * geotransform[4] + rows * geotransform[5]])
+
+
+def _contains_pole(latitude, projection, geotransform, width, height):
+    """ checks whether a pole lies inside a raster, whose edges then do not reach the latitude of the pole \n
+    input "latitude": type int, 90 or -90 \n
+    """
+    # the geotransform is in x, y order whatever the axis order of the CRS, e.g. longitude, latitude for EPSG:4326
+    try:
+        x, y = hf.transform_points([[0, latitude]], hf.WGS84_EPSG_ID, projection, traditional_gis_order=True)[0]
+    except Exception:
+        # the pole has no coordinates in the CRS of the raster
+        return False
+    inverse = gdal.InvGeoTransform(geotransform)
+    if inverse is None:
+        return False
+    column, row = gdal.ApplyGeoTransform(inverse, x, y)
+    return 0 <= column <= width and 0 <= row <= height
+
+
+def getBoundingBox(filepath, dataset=None, edge_points=None, first_subdataset_only=None):
     """ extracts bounding box from raster \n
     input "filepath": type string, file path to raster file \n
+    input "dataset": type gdal.Dataset, already opened handle of the file (optional) \n
+    input "edge_points": type int, points per edge of the raster transformed to WGS84, at least 2, 2 only
+    transforms the four corners (default EDGE_POINTS) \n
+    input "first_subdataset_only": type bool, for containers only read the first georeferenced subdataset
+    (default FIRST_SUBDATASET_ONLY) \n
     returns bounding box of the file: type list, length = 4 , type = float, schema = [min(longs), min(lats), max(longs), max(lats)]
     """
     # Enable exceptions
@@ -43,54 +170,150 @@ def getBoundingBox(filepath):
     crs_output = hf.WGS84_EPSG_ID
     gdal.UseExceptions()
 
-    geotiffContent = gdal.Open(filepath)
+    if dataset is None:
+        dataset = gdal.Open(filepath)
+    geotiffContent = dataset
 
-    # get the existing coordinate system
-    old_crs = osr.SpatialReference()
-    old_crs.ImportFromWkt(geotiffContent.GetProjectionRef())
+    if geotiffContent.RasterCount == 0:
+        # merge the bounding boxes of the subdatasets of a container
+        boxes = _map_subdatasets(geotiffContent, lambda name, subdataset: getBoundingBox(
+            name, subdataset, edge_points)["bbox"], first_subdataset_only)
+        if len(boxes) == 0:
+            raise Exception("{} has no georeferenced subdataset".format(filepath))
+        boxes = np.array(boxes)
+        return {"bbox": [float(boxes[:, 0].min()), float(boxes[:, 1].min()), float(boxes[:, 2].max()),
+                         float(boxes[:, 3].max())],
+                "crs": str(crs_output)}
 
-    # create the new coordinate system
+    # get the existing coordinate system, the target system and the transformation between them are cached
+    projection = geotiffContent.GetProjectionRef()
 
-    new_crs = osr.SpatialReference()
-    new_crs.ImportFromEPSG(crs_output)
-
-    # get the point to transform, pixel (0,0) in this case
+    # only the header is read: size and geotransform give the edges of the raster in its CRS
     width = geotiffContent.RasterXSize
     height = geotiffContent.RasterYSize
     gt = geotiffContent.GetGeoTransform()
 
-    min_x = gt[0]
-    min_y = gt[3] + width * gt[4] + height * gt[5]
-    max_x = gt[0] + width * gt[1] + height * gt[2]
-    max_y = gt[3]
+    # the edges of rasters in polar, rotated or wide projected CRS are curved in WGS84, the corners alone
+    # do not span their extent
+    if edge_points is None:
+        edge_points = EDGE_POINTS
+    elif edge_points < 2:
+        raise Exception("edge_points must be at least 2, got {}".format(edge_points))
+    points = _edge_points(gt, width, height, edge_points)
 
-    transform = osr.CoordinateTransformation(old_crs, new_crs)
     try:
-        # get the coordinates in lat long
-        lat_long_min = transform.TransformPoint(min_x, min_y)
-        lat_long_max = transform.TransformPoint(max_x, max_y)
-    except:
+        # get the coordinates in long lat, all points in one batch; the geotransform is in x, y order whatever
+        # the axis order of the CRS
+        transformed = hf.transform_points(points, projection, crs_output, allow_failed=True,
+                                          traditional_gis_order=True)
+        transformed = transformed[np.isfinite(transformed).all(axis=1)]
+        if len(transformed) == 0:
+            raise Exception("None of the edge points could be transformed")
+    except Exception:
         # Assume that coordinates are in EPSG:4236
         logger.debug("{}: There is no identifiable coordinate reference system. We will try to use EPSG: 4326 "
                      .format(filepath))
-        lat_long_min = [min_y, min_x]
-        lat_long_max = [max_y, max_x]
+        return {"bbox": [points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()],
+                "crs": str(crs_output)}
 
-    bbox = [lat_long_min[0], lat_long_min[1], lat_long_max[0], lat_long_max[1]]
+    bbox = [transformed[:, 0].min(), transformed[:, 1].min(), transformed[:, 0].max(), transformed[:, 1].max()]
 
-    if int(osgeo.__version__[0]) >= 3:
-        if old_crs.GetAxisMappingStrategy() == 1:
-            bbox = [lat_long_min[1], lat_long_min[0], lat_long_max[1], lat_long_max[0]]
+    # the edges of rasters in geographic CRS reach the latitude of a pole they contain
+    poles = () if hf.get_spatial_reference(projection).IsGeographic() else (90, -90)
+    for latitude in poles:
+        if _contains_pole(latitude, projection, gt, width, height):
+            logger.debug("{}: The raster contains the pole at latitude {}".format(filepath, latitude))
+            bbox = [-180.0, min(bbox[1], latitude), 180.0, max(bbox[3], latitude)]
 
-    spatialExtent = {"bbox": bbox, "crs": str(crs_output)}
+    spatialExtent = {"bbox": [float(coordinate) for coordinate in bbox], "crs": str(crs_output)}
 
     return spatialExtent
 
 
-def getTemporalExtent(filepath):
-    """ extracts temporal extent of the geotiff \n
-    input "filepath": type string, file path to geotiff file \n
-    returns None as There is no time value for GeoTIFF files
+def _netcdf_times(metadata):
+    """ dates of the band dimensions of a netCDF file, e.g. NETCDF_DIM_time_VALUES={0,31} with time#units \n
+    input "metadata": type dict, metadata of the default domain of the dataset \n
+    """
+    times = []
+    for key, value in metadata.items():
+        match = netcdf_dim_regexp.match(key)
+        if match is None:
+            continue
+        try:
+            values = [float(v) for v in value.strip("{}").split(",") if v.strip()]
+        except ValueError:
+            continue
+        decoded = hf.decode_cf_time(values, metadata.get(match.group(1) + "#units"))
+        if decoded is not None:
+            times.extend(decoded)
+    return times
+
+
+def _grib_times(dataset):
+    """ valid times of the messages (bands) of a GRIB file, e.g. GRIB_VALID_TIME=1585699200 sec UTC \n
+    """
+    seconds = []
+    for i in range(1, dataset.RasterCount + 1):
+        match = grib_time_regexp.match(dataset.GetRasterBand(i).GetMetadataItem("GRIB_VALID_TIME") or "")
+        if match is not None:
+            seconds.append(int(match.group(1)))
+    return list(pd.to_datetime(seconds, unit="s"))
+
+
+def _multidim_times(filepath):
+    """ dates of the time dimensions of a file read with GDAL's multidimensional API \n
+    """
+    dataset = hf.open_multidim_dataset(filepath)
+    if dataset is None:
+        return []
+    return hf.multidim_times(dataset.GetRootGroup())
+
+
+def _metadata_times(dataset):
+    """ dates in the metadata of a dataset: TIFF DATETIME, netCDF time dimension, GRIB valid time \n
     """
-    logger.debug('{} There is no time value for raster files'.format(filepath))
-    return None
+    metadata = dataset.GetMetadata() or {}
+
+    times = _netcdf_times(metadata)
+
+    if dataset.GetDriver().ShortName == "GRIB":
+        times.extend(_grib_times(dataset))
+
+    if "TIFFTAG_DATETIME" in metadata:
+        tiff_time = pd.to_datetime(metadata["TIFFTAG_DATETIME"], format="%Y:%m:%d %H:%M:%S", errors="coerce")
+        if not pd.isnull(tiff_time):
+            times.append(tiff_time)
+
+    return times
+
+
+def getTemporalExtent(filepath, dataset=None, first_subdataset_only=None):
+    """ extracts temporal extent of the raster from its metadata, without reading raster data \n
+    input "filepath": type string, file path to raster file \n
+    input "dataset": type gdal.Dataset, already opened handle of the file (optional) \n
+    input "first_subdataset_only": type bool, for containers only read the first georeferenced subdataset with
+    time metadata (default FIRST_SUBDATASET_ONLY) \n
+    returns temporal extent of the file: type list, length = 2, type = string, schema = [min(dates), max(dates)],
+    None if the metadata has no time (TIFF DATETIME, netCDF time dimension, GRIB valid time)
+    """
+    if dataset is None:
+        dataset = hf.open_dataset(filepath)
+    driver = dataset.GetDriver().ShortName
+
+    times = _metadata_times(dataset)
+
+    if not times and dataset.RasterCount == 0:
+        # the time dimensions of containers are in the metadata of their subdatasets
+        for subdataset_times in _map_subdatasets(dataset, lambda name, subdataset: _metadata_times(subdataset) or None,
+                                                 first_subdataset_only):
+            times.extend(subdataset_times)
+
+    if not times and driver in hf.MULTIDIM_DRIVERS:
+        # time is no band dimension, read its coordinate variable
+        times = _multidim_times(filepath)
+
+    if len(times) == 0:
+        logger.debug('{} There is no time value in the metadata of the raster file'.format(filepath))
+        return None
+
+    return [min(times).strftime(hf.output_time_format), max(times).strftime(hf.output_time_format)]
@@ -1,7 +1,6 @@
 import logging
 import osgeo
 from osgeo import ogr
-from osgeo import gdal
 from . import helpfunctions as hf
 import re
 
@@ -14,20 +13,28 @@ def get_handler_name():
     return "handleVector"
 
 
-def checkFileSupported(filepath):
+def _layers(datasource):
+    # gdal.Dataset handles shared by extent.fromFile are not iterable like ogr.DataSource
+    for i in range(datasource.GetLayerCount()):
+        yield datasource.GetLayer(i)
+
+
+def checkFileSupported(filepath, dataset=None):
     '''Checks whether it is valid vector file or not. \n
     input "path": type string, path to file which shall be extracted \n
+    input "dataset": type gdal.Dataset, already opened handle of the file (optional) \n
     '''
 
     logger.debug(filepath)
     try:
-        file = gdal.OpenEx(filepath)
-        driver = file.GetDriver().ShortName
+        if dataset is None:
+            dataset = hf.open_dataset(filepath)
+        driver = dataset.GetDriver().ShortName
     except:
         logger.debug("File {} is NOT supported by HandleVector module".format(filepath))
         return False
-    logger.debug("Layer count: {} ".format(file.GetLayerCount()))
-    if file.GetLayerCount() > 0:
+    logger.debug("Layer count: {} ".format(dataset.GetLayerCount()))
+    if dataset.GetLayerCount() > 0:
         if driver != "CSV":
             logger.debug("File {} is supported by HandleVector module".format(filepath))
             return True
@@ -36,17 +43,18 @@ def checkFileSupported(filepath):
         return False
 
 
-def getTemporalExtent(filepath):
+def getTemporalExtent(filepath, dataset=None):
     ''' extracts temporal extent of the vector file \n
-    input "path": type string, file path to vector file
+    input "path": type string, file path to vector file \n
+    input "dataset": type gdal.Dataset, already opened handle of the file (optional)
     '''
 
-    datasource = ogr.Open(filepath)
+    datasource = dataset if dataset is not None else ogr.Open(filepath)
     layer_count = datasource.GetLayerCount()
     logger.debug("{} contains {} layers".format(filepath, layer_count))
     datetime_list = []
 
-    for layer in datasource:
+    for layer in _layers(datasource):
 
         logger.debug("{} : Extracting temporal extent from layer {} ".format(filepath, layer))
         layerDefinition = layer.GetLayerDefn()
@@ -102,15 +110,16 @@ def getTemporalExtent(filepath):
     return tbox
 
 
-def getBoundingBox(filepath):
+def getBoundingBox(filepath, dataset=None):
     """ extracts bounding box from vector file \n
     input "filepath": type string, file path to vector \n
+    input "dataset": type gdal.Dataset, already opened handle of the file (optional) \n
     returns bounding box of the file: type list, length = 4
     """
-    datasource = ogr.Open(filepath)
+    datasource = dataset if dataset is not None else ogr.Open(filepath)
     geo_dict = {}
 
-    for layer in datasource:
+    for layer in _layers(datasource):
         layer_name = layer.GetDescription()
         ext = layer.GetExtent()
         bbox = [ext[0], ext[2], ext[1], ext[3]]
@@ -124,7 +133,7 @@ def getBoundingBox(filepath):
             crs = None
 
         # Patch GDAL > 3.2 for GML  https://github.com/OSGeo/gdal/issues/2195
-        if int(osgeo.__version__[0]) >= 3 and int(osgeo.__version__[2]) < 2 and datasource.GetDriver().GetName() =="GML":
+        if int(osgeo.__version__[0]) >= 3 and int(osgeo.__version__[2]) < 2 and datasource.GetDriver().GetDescription() == "GML":
             bbox = [ext[2], ext[0], ext[3], ext[1]]
 
         geo_dict[layer_name] = {"bbox": bbox, "crs": crs}
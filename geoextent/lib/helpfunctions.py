@@ -1,3 +1,5 @@
+import collections
+import contextlib
 import csv
 import datetime
 import itertools
@@ -6,9 +8,12 @@ import os
 import patoolib
 import random
 import re
-import uuid
+import tarfile
+import threading
+import zipfile
 import numpy as np
 import pandas as pd
+from osgeo import gdal
 from osgeo import ogr
 from osgeo import osr
 from pandas.core.tools.datetimes import _guess_datetime_format_for_array as time_format
@@ -23,6 +28,25 @@ osr.UseExceptions()
 output_time_format = '%Y-%m-%d'
 PREFERRED_SAMPLE_SIZE = 30
 WGS84_EPSG_ID = 4326
+# drivers of GDAL's multidimensional API, whose files may have coordinate variables and time dimensions that are
+# no band dimension
+MULTIDIM_DRIVERS = {"netCDF", "HDF5", "Zarr"}
+# extensions of the files geoextent extracts extents from, and of archives that may contain such files
+SUPPORTED_EXTENSIONS = {"geojson", "json", "csv", "tif", "tiff", "geotiff", "shp", "gpkg", "gpx", "gml", "kml", "kmz",
+                        "nc", "nc4", "jp2", "asc", "fgb", "osm", "xml", "hdf", "h5", "hdf5", "he5", "zarr",
+                        "grib", "grib2", "grb", "grb2",
+                        "zip", "tar", "gz", "tgz", "bz2", "xz", "7z", "rar"}
+# GDAL virtual file systems reading the members of archives without extracting them, by ending of the file name
+# (the first matching ending is used, so .tar.gz comes before .gz)
+VSI_ARCHIVE_PREFIXES = ((".zip", "/vsizip/"), (".tar", "/vsitar/"), (".tar.gz", "/vsitar/"), (".tgz", "/vsitar/"),
+                        (".gz", "/vsigzip/"))
+# members of archives that are extracted to disk: CSV files are read with Python instead of GDAL, and nested archives
+EXTRACTED_MEMBER_EXTENSIONS = {"csv", "zip", "tar", "gz", "tgz", "bz2", "xz", "7z", "rar"}
+# files marking a folder as Zarr store (version 2 group or array, version 3)
+ZARR_MARKERS = (".zgroup", ".zarray", "zarr.json")
+# number of SpatialReference and CoordinateTransformation objects kept by get_spatial_reference and
+# coordinate_transformation
+CRS_CACHE_SIZE = 128
 logger = logging.getLogger("geoextent")
 
 https_regexp = re.compile('https://(.*)')
@@ -34,11 +58,48 @@ https_regexp = re.compile('https://(.*)')
 doi_regexp = re.compile(
     r"(doi:\s*|(?:https?://)?(?:dx\.)?doi\.org/)?(10\.\d+(.\d+)*/.+)$", flags=re.I)
 
+# units of CF time coordinates, e.g. "days since 1900-01-01 00:00:00"
+cf_time_regexp = re.compile(r"^\s*([a-z]+?)s?\s+since\s+(.+?)\s*$", flags=re.I)
+# seconds per CF time unit, months and years as defined by UDUNITS
+CF_TIME_UNITS = {"second": 1, "sec": 1, "s": 1, "minute": 60, "min": 60, "hour": 3600, "hr": 3600, "h": 3600,
+                 "day": 86400, "d": 86400, "week": 604800, "month": 2629743.831225, "year": 31556925.9747}
+
 zenodo_regexp = re.compile(
     r"(https://zenodo.org/record/)?(.\d*)$", flags=re.I
 )
 
 
+def open_dataset(filepath):
+    """
+    Function purpose: open a file once with GDAL so that format detection and extraction share the handle \n
+    filepath: path to file \n
+    Output: gdal.Dataset, or None if GDAL cannot open the file
+    """
+    try:
+        dataset = gdal.OpenEx(filepath)
+    except Exception as e:
+        logger.debug("GDAL could not open {}: {}".format(filepath, e))
+        return None
+    return dataset
+
+
+def open_multidim_dataset(filepath, dataset=None):
+    """
+    Function purpose: open a gridded dataset with GDAL's multidimensional API \n
+    filepath: path to file or Zarr store \n
+    dataset: gdal.Dataset, handle of the file opened by open_dataset, the file is only opened again if its driver
+    is one of MULTIDIM_DRIVERS (optional) \n
+    Output: gdal.Dataset opened with gdal.OF_MULTIDIM_RASTER, or None
+    """
+    if dataset is not None and dataset.GetDriver().ShortName not in MULTIDIM_DRIVERS:
+        return None
+    try:
+        return gdal.OpenEx(filepath, gdal.OF_MULTIDIM_RASTER)
+    except Exception as e:
+        logger.debug("GDAL could not open {} as multidimensional dataset: {}".format(filepath, e))
+        return None
+
+
 def getAllRowElements(row_name, elements, exp_data=None):
     """
     Function purpose: help-function to get all row elements for a specific string \n
@@ -106,29 +167,121 @@ def searchForParameters(elements, param_array, exp_data=None):
     return matching_elements
 
 
-def transformingIntoWGS84(crs, coordinate):
+_spatial_references = collections.OrderedDict()
+_transformations = collections.OrderedDict()
+_crs_cache_lock = threading.Lock()
+
+
+def _crs_key(crs):
+    # EPSG codes arrive as int or str ("4326"), anything else is treated as WKT
+    if isinstance(crs, int) or (isinstance(crs, str) and crs.isdigit()):
+        return int(crs)
+    return crs
+
+
+def _cached(cache, key, create):
     """
-    Function purpose: transforming SRS into WGS84 (EPSG:4326) \n
-    Input: crs, point \n
-    Output: retPoint constisting of x2, y2 (transformed points)
+    Function purpose: least recently used lookup in one of the CRS caches, create(key) builds missing entries
+    """
+    with _crs_cache_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+    # built without holding the lock, create() of a transformation looks up its spatial references in the cache
+    value = create(key)
+
+    with _crs_cache_lock:
+        if key in cache:
+            # built by another thread in the meantime
+            cache.move_to_end(key)
+            return cache[key]
+        cache[key] = value
+        if len(cache) > CRS_CACHE_SIZE:
+            cache.popitem(last=False)
+        return value
+
+
+def _create_spatial_reference(key):
+    spatial_reference = osr.SpatialReference()
+    if isinstance(key, int):
+        spatial_reference.ImportFromEPSG(key)
+    else:
+        spatial_reference.ImportFromWkt(key)
+    return spatial_reference
+
+
+def get_spatial_reference(crs):
+    """
+    Function purpose: process-wide cached osr.SpatialReference, do not modify the returned object \n
+    crs: EPSG code (int or str) or WKT (str) \n
+    Output: osr.SpatialReference
     """
-    # TODO: check whether current src is 4326
-    source = osr.SpatialReference()
-    source.ImportFromEPSG(int(crs))
+    return _cached(_spatial_references, _crs_key(crs), _create_spatial_reference)
 
-    target = osr.SpatialReference()
-    target.ImportFromEPSG(WGS84_EPSG_ID)
 
-    transform = osr.CoordinateTransformation(source, target)
+def _traditional_gis_order(spatial_reference):
+    # GDAL < 3 always uses longitude, latitude (x, y) order
+    if not hasattr(osr, "OAMS_TRADITIONAL_GIS_ORDER"):
+        return spatial_reference
+    spatial_reference = spatial_reference.Clone()
+    spatial_reference.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return spatial_reference
 
-    point = ogr.Geometry(ogr.wkbPoint)
-    point.AddPoint(float(coordinate[0]), float(coordinate[1]))
-    point = point.ExportToWkt()
-    point = ogr.CreateGeometryFromWkt(point)
 
-    point.Transform(transform)
+@contextlib.contextmanager
+def coordinate_transformation(source_crs, target_crs=WGS84_EPSG_ID, traditional_gis_order=False):
+    """
+    Function purpose: process-wide cached osr.CoordinateTransformation, to be used as context manager \n
+    source_crs, target_crs: EPSG code (int or str) or WKT (str) \n
+    traditional_gis_order: points are in x, y (longitude, latitude) order in both CRS instead of the axis
+    order of the authority \n
+    Output: osr.CoordinateTransformation, reserved for the calling thread inside the with block since
+    transformation objects must not be used by several threads at once
+    """
 
-    return [point.GetX(), point.GetY()]
+    def create(key):
+        source, target = get_spatial_reference(key[0]), get_spatial_reference(key[1])
+        if key[2]:
+            source, target = _traditional_gis_order(source), _traditional_gis_order(target)
+        return osr.CoordinateTransformation(source, target), threading.Lock()
+
+    key = (_crs_key(source_crs), _crs_key(target_crs), traditional_gis_order)
+    transform, lock = _cached(_transformations, key, create)
+    with lock:
+        yield transform
+
+
+def transform_points(points, source_crs, target_crs=WGS84_EPSG_ID, allow_failed=False, traditional_gis_order=False):
+    """
+    Function purpose: transforming an array of points with a single TransformPoints call \n
+    points: array-like, shape (N, 2) \n
+    source_crs, target_crs: EPSG code (int or str) or WKT (str) \n
+    allow_failed: return points that cannot be transformed as inf instead of raising an exception \n
+    traditional_gis_order: points are in x, y (longitude, latitude) order in both CRS \n
+    Output: numpy array, shape (N, 2), transformed points
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) == 0:
+        return points
+
+    with coordinate_transformation(source_crs, target_crs, traditional_gis_order) as transform:
+        transformed = np.array(transform.TransformPoints(points.tolist()), dtype=float)[:, :2]
+
+    if not allow_failed and not np.isfinite(transformed).all():
+        raise Exception("{} of {} points could not be transformed from {} to {}".format(
+            int((~np.isfinite(transformed).all(axis=1)).sum()), len(points), source_crs, target_crs))
+
+    return transformed
+
+
+def transformingIntoWGS84(crs, coordinate):
+    """
+    Function purpose: transforming SRS into WGS84 (EPSG:4326) \n
+    Input: crs, point \n
+    Output: retPoint constisting of x2, y2 (transformed points)
+    """
+    return transform_points([coordinate], int(crs))[0].tolist()
 
 
 def transformingArrayIntoWGS84(crs, pointArray):
@@ -137,17 +290,13 @@ def transformingArrayIntoWGS84(crs, pointArray):
     Input: crs, pointArray \n
     Output: array array
     """
-    # print("----<>", pointArray)#
-    array = []
     # vector_rep
     if type(pointArray[0]) == list:
-        for x in pointArray:
-            array.append(transformingIntoWGS84(crs, x))
-        return array
+        return transform_points(pointArray, int(crs)).tolist()
     # bbox
     elif len(pointArray) == 4:
-        bbox = [[pointArray[0], pointArray[1]], [pointArray[2], pointArray[3]]]
-        transf_bbox = transformingArrayIntoWGS84(crs, bbox)
+        transf_bbox = transform_points([[pointArray[0], pointArray[1]], [pointArray[2], pointArray[3]]],
+                                       int(crs)).tolist()
         return [transf_bbox[0][0], transf_bbox[0][1], transf_bbox[1][0], transf_bbox[1][1]]
 
 
@@ -268,37 +417,217 @@ def date_parser(datetime_list, num_sample=None):
     return parse_time
 
 
-def extract_archive(filepath) -> Path:
+def decode_cf_time(values, units):
     """
-    Function purpose: extract archive (always inside a new folder)
-    filepath: filepath to archive
+    Function purpose: convert the values of a CF time coordinate to dates, other calendars than the
+    standard one are treated like it \n
+    values: numbers, e.g. [0, 31, 59] \n
+    units: units attribute of the coordinate, e.g. "days since 1900-01-01 00:00:00" \n
+    Output: pandas DatetimeIndex, or None if units is no CF time unit or the dates are out of range
+    """
+    match = cf_time_regexp.match(units or "")
+    if match is None or match.group(1).lower() not in CF_TIME_UNITS:
+        return None
+
+    seconds = np.asarray(values, dtype=float).ravel() * CF_TIME_UNITS[match.group(1).lower()]
+    # leaves out fill values, e.g. 9.96921e+36, and offsets beyond the range of pandas (about 292 years)
+    seconds = seconds[np.isfinite(seconds) & (np.abs(seconds) < 9e9)]
+    try:
+        reference = pd.Timestamp(match.group(2))
+        if reference.tzinfo is not None:
+            reference = reference.tz_convert(None)
+        return reference + pd.to_timedelta(seconds, unit="s")
+    except (ValueError, OverflowError) as e:
+        logger.debug("Could not decode time values with units {}: {}".format(units, e))
+        return None
+
+
+def multidim_times(group):
+    """
+    Function purpose: dates of the time dimensions of a group opened with gdal.OF_MULTIDIM_RASTER and its
+    subgroups, reading only their coordinate variables \n
+    group: gdal.Group, e.g. the root group \n
+    Output: list of pandas Timestamps
     """
+    times = []
+    for dimension in group.GetDimensions() or []:
+        if dimension.GetType() != gdal.DIM_TYPE_TEMPORAL and dimension.GetName().lower() != "time":
+            continue
+        variable = dimension.GetIndexingVariable()
+        if variable is None:
+            continue
+        units = variable.GetUnit()
+        if not units:
+            attribute = variable.GetAttribute("units")
+            units = attribute.ReadAsString() if attribute is not None else None
+        decoded = decode_cf_time(variable.ReadAsArray(), units)
+        if decoded is not None:
+            times.extend(decoded)
+
+    for name in group.GetGroupNames() or []:
+        times.extend(multidim_times(group.OpenGroup(name)))
+
+    return times
 
-    filepath = Path(filepath)
 
-    while True:
-        folder_to_extract = Path.joinpath(filepath.parent, f"{filepath.name}_{uuid.uuid4()}")
-        if not folder_to_extract.exists():
-            break
+def extract_archive(filepath, folder_to_extract) -> Path:
+    """
+    Function purpose: extract archive inside folder_to_extract
+    filepath: filepath to archive
+    Output: folder_to_extract, raises an Exception if the archive could not be extracted
+    """
+
+    folder_to_extract = Path(folder_to_extract)
+    folder_to_extract.mkdir(parents=True, exist_ok=True)
 
     try:
-        patoolib.extract_archive(archive=filepath, outdir=folder_to_extract, verbosity=-1)
-    except patoolib.util.PatoolError:
-        pass
-    except TypeError:
-        # exception to prevent this error:
-        # TypeError: Path.replace() takes 2 positional arguments but 3 were given
-        pass
-    except Exception:
-        pass
-    finally:
-        folder_to_extract.mkdir(parents=True, exist_ok=True)
-        # to prevent this error:
-        # [Errno 2] No such file or directory:
+        # patool expects strings, Path objects raise TypeError: Path.replace() takes 2 positional arguments
+        patoolib.extract_archive(archive=str(filepath), outdir=str(folder_to_extract), verbosity=-1)
+    except Exception as e:
+        raise Exception("The archive {} could not be extracted \n error {}".format(filepath, e))
 
     return folder_to_extract
 
 
+def archive_size(filepath):
+    """
+    Function purpose: uncompressed size of an archive, from the member sizes declared in its listing
+    filepath: filepath to archive
+    Output: size in bytes, or None if the size cannot be read without extracting (other formats than ZIP and tar)
+    """
+    try:
+        if zipfile.is_zipfile(filepath):
+            with zipfile.ZipFile(filepath) as archive:
+                return sum(member.file_size for member in archive.infolist())
+        if tarfile.is_tarfile(filepath):
+            with tarfile.open(filepath) as archive:
+                return sum(member.size for member in archive.getmembers())
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        logger.debug("Could not list archive {}: {}".format(filepath, e))
+    return None
+
+
+def is_virtual(path):
+    """
+    Function purpose: check if a path is inside a GDAL virtual file system, e.g. /vsizip/
+    """
+    return str(path).startswith("/vsi")
+
+
+def is_archive(path):
+    """
+    Function purpose: check if a path on disk is an archive, members of archives read with GDAL never are
+    """
+    return not is_virtual(path) and patoolib.is_archive(path)
+
+
+def archive_vsi_path(filepath):
+    """
+    Function purpose: path under which GDAL reads the members of an archive without extracting it
+    filepath: filepath to archive
+    Output: /vsizip/, /vsitar/ or /vsigzip/ path, or None if GDAL has no virtual file system for the archive
+    """
+    name = str(filepath).lower()
+    for ending, prefix in VSI_ARCHIVE_PREFIXES:
+        if name.endswith(ending):
+            return prefix + os.path.abspath(filepath)
+    return None
+
+
+def open_archive(filepath):
+    """
+    Function purpose: make the members of an archive available through a GDAL virtual file system
+    filepath: filepath to archive
+    Output: virtual folder of the archive, or None if GDAL cannot read it and it must be extracted
+    """
+    vsi_path = archive_vsi_path(filepath)
+    if vsi_path is not None:
+        if vsi_path.startswith("/vsigzip/") and gdal.VSIStatL(vsi_path) is not None:
+            return vsi_path
+        if gdal.ReadDir(vsi_path) is not None:
+            return vsi_path
+        logger.debug("GDAL cannot read archive {}, extracting it".format(filepath))
+    return None
+
+
+def list_directory(path):
+    """
+    Function purpose: list a folder on disk or inside an archive read through a GDAL virtual file system
+    path: folder, or virtual folder from open_archive
+    Output: list of (file name, path) pairs
+    """
+    if not is_virtual(path):
+        return [(filename, os.path.join(path, filename)) for filename in os.listdir(path)]
+    if path.startswith("/vsigzip/"):
+        # a gzip file holds a single member, named like the archive without .gz
+        return [(os.path.basename(path)[:-len(".gz")], path)]
+    return [(filename, path + "/" + filename) for filename in gdal.ReadDir(path) or []]
+
+
+def is_directory(path):
+    """
+    Function purpose: check if a path on disk or inside a GDAL virtual file system is a folder
+    """
+    if not is_virtual(path):
+        return os.path.isdir(path)
+    stat = gdal.VSIStatL(path)
+    return stat is not None and stat.IsDirectory()
+
+
+def is_zarr_store(path):
+    """
+    Function purpose: check if a folder on disk or inside a GDAL virtual file system is a Zarr store, which is
+    extracted as one dataset instead of file by file
+    """
+    if not is_directory(path):
+        return False
+    for marker in ZARR_MARKERS:
+        if is_virtual(path):
+            if gdal.VSIStatL(path + "/" + marker) is not None:
+                return True
+        elif os.path.isfile(os.path.join(path, marker)):
+            return True
+    return False
+
+
+def needs_extraction(path, filename):
+    """
+    Function purpose: check if a member of an archive read through a GDAL virtual file system must be copied to disk
+    path: path of the member inside a GDAL virtual file system, or of a file on disk
+    filename: name of the member, deciding by its extension (EXTRACTED_MEMBER_EXTENSIONS)
+    """
+    return is_virtual(path) and Path(filename).suffix[1:].lower() in EXTRACTED_MEMBER_EXTENSIONS \
+        and not is_directory(path)
+
+
+def member_size(path):
+    """
+    Function purpose: size in bytes of a file on disk or inside a GDAL virtual file system
+    """
+    if not is_virtual(path):
+        return os.path.getsize(path)
+    stat = gdal.VSIStatL(path)
+    return stat.size if stat is not None else 0
+
+
+def copy_member(path, filepath):
+    """
+    Function purpose: copy a member of an archive read through a GDAL virtual file system to filepath on disk
+    """
+    source = gdal.VSIFOpenL(path, "rb")
+    if source is None:
+        raise Exception("Could not read {}".format(path))
+    try:
+        with open(filepath, "wb") as target:
+            while True:
+                chunk = gdal.VSIFReadL(1, 1024 * 1024, source)
+                if not chunk:
+                    break
+                target.write(chunk)
+    finally:
+        gdal.VSIFCloseL(source)
+
+
 def bbox_merge(metadata, origin):
     """
     Function purpose: merge bounding boxes
@@ -307,59 +636,47 @@ def bbox_merge(metadata, origin):
     Output: Merged bbox (dict)
     """
     logger.debug("metadata {}".format(metadata))
-    boxes_extent = []
+    boxes_by_crs = {}
     metadata_merge = {}
     num_files = len(metadata.items())
     for x, y in metadata.items():
         if isinstance(y, dict):
             try:
-                bbox_extent = [y['bbox'], y['crs']]
-                boxes_extent.append(bbox_extent)
+                box = [float(y['bbox'][i]) for i in range(4)]
+                boxes_by_crs.setdefault(y['crs'], []).append(box)
             except:
                 logger.debug("{} does not have identifiable geographical extent (CRS+bbox)".format(x))
                 pass
-    if len(boxes_extent) == 0:
+    if len(boxes_by_crs) == 0:
         logger.debug(
             " ** {} does not have geometries with identifiable geographical extent (CRS+bbox)".format(origin))
         return None
-    elif len(boxes_extent) > 0:
+    elif len(boxes_by_crs) > 0:
 
-        multipolygon = ogr.Geometry(ogr.wkbMultiPolygon)
-        des_crs = ogr.osr.SpatialReference()
-        des_crs.ImportFromEPSG(WGS84_EPSG_ID)
-        multipolygon.AssignSpatialReference(des_crs)
+        # the corners of all boxes in WGS84, shape (number of boxes, 4, 2)
+        corners_wgs84 = []
 
-        for bbox in boxes_extent:
+        for crs, boxes in boxes_by_crs.items():
+            boxes = np.array(boxes)
+            corners = boxes[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 4, 2)
 
-            try:
-                box = ogr.Geometry(ogr.wkbLinearRing)
-                box.AddPoint(bbox[0][0], bbox[0][1])
-                box.AddPoint(bbox[0][2], bbox[0][1])
-                box.AddPoint(bbox[0][2], bbox[0][3])
-                box.AddPoint(bbox[0][0], bbox[0][3])
-                box.AddPoint(bbox[0][0], bbox[0][1])
-
-                if bbox[1] != str(WGS84_EPSG_ID):
-                    source = osr.SpatialReference()
-                    source.ImportFromEPSG(int(bbox[1]))
-                    transform = osr.CoordinateTransformation(source, des_crs)
-                    box.Transform(transform)
-
-                polygon = ogr.Geometry(ogr.wkbPolygon)
-                polygon.AddGeometry(box)
-                multipolygon.AddGeometry(polygon)
-
-            except Exception as e:
-                logger.debug(
-                    "Error extracting geographic extent. CRS {} may be invalid. Error: {}".format(int(bbox[1]), e))
-                continue
-
-        num_geo_files = multipolygon.GetGeometryCount() / 4
+            if crs != str(WGS84_EPSG_ID):
+                try:
+                    corners = _transform_corners(corners, int(crs))
+                except Exception as e:
+                    logger.debug("Error extracting geographic extent. CRS {} may be invalid. Error: {}".format(crs, e))
+                    continue
+                # like a failing OGR transformation, boxes with corners out of reach of the CRS are skipped
+                corners = corners[np.isfinite(corners).all(axis=(1, 2))]
+
+            corners_wgs84.append(corners)
+
+        num_geo_files = sum(len(corners) for corners in corners_wgs84)
         if num_geo_files > 0:
             logger.debug('{} contains {} geometries out of {} with identifiable geographic extent'.format(origin, int(
                 num_geo_files), num_files))
-            env = multipolygon.GetEnvelope()
-            metadata_merge['bbox'] = [env[0], env[2], env[1], env[3]]
+            points = np.concatenate(corners_wgs84).reshape(-1, 2)
+            metadata_merge['bbox'] = [*points.min(axis=0).tolist(), *points.max(axis=0).tolist()]
             metadata_merge['crs'] = str(WGS84_EPSG_ID)
         else:
             logger.debug(" {} does not have geometries with identifiable geographical extent (CRS+bbox)".format(origin))
@@ -368,6 +685,30 @@ def bbox_merge(metadata, origin):
     return metadata_merge
 
 
+def _transform_corners(corners, crs):
+    """
+    Function purpose: transform the corners of boxes in one CRS into WGS84 in one batch
+    corners: numpy array, shape (number of boxes, 4, 2)
+    Output: numpy array of the same shape, corners that cannot be transformed are inf
+    """
+    try:
+        return transform_points(corners.reshape(-1, 2), crs, allow_failed=True).reshape(corners.shape)
+    except Exception:
+        if len(corners) == 1:
+            raise
+        # raises if the CRS itself is invalid, every box would fail the same way
+        with coordinate_transformation(crs):
+            pass
+    # one box made the whole batch fail, transform box by box so the other boxes are kept
+    transformed = np.full(corners.shape, np.inf)
+    for i, box_corners in enumerate(corners):
+        try:
+            transformed[i] = transform_points(box_corners, crs, allow_failed=True)
+        except Exception as e:
+            logger.debug("Error extracting geographic extent. CRS {} may be invalid. Error: {}".format(crs, e))
+    return transformed
+
+
 def tbox_merge(metadata, path):
     """
     Function purpose: Merge time boxes
@@ -402,6 +743,46 @@ def tbox_merge(metadata, path):
     return time_ext
 
 
+def is_supported_file(filepath):
+    """
+    Function purpose: guess from its extension if geoextent can extract an extent from a file
+    filepath: path or name of the file
+    Output: True if the extension is one of SUPPORTED_EXTENSIONS
+    """
+    return Path(filepath).suffix[1:].lower() in SUPPORTED_EXTENSIONS
+
+
+def declared_extent(points=(), boxes=(), periods=()):
+    """
+    Function purpose: Merge the extent a repository record declares in its metadata
+    points: (longitude, latitude) pairs in WGS84
+    boxes: [min longitude, min latitude, max longitude, max latitude] lists in WGS84
+    periods: (start, end) pairs of ISO 8601 dates or date-times, either may be None
+    Output: dict with bbox and crs and/or tbox, None if the metadata declares no valid extent
+    """
+    extent = {}
+
+    corners = [(float(lon), float(lat)) for lon, lat in points]
+    for box in boxes:
+        corners += [(float(box[0]), float(box[1])), (float(box[2]), float(box[3]))]
+    corners = [corner for corner in corners if validate_bbox_wgs84([*corner, *corner])]
+    if corners:
+        lons, lats = zip(*corners)
+        extent['bbox'] = [min(lons), min(lats), max(lons), max(lats)]
+        extent['crs'] = str(WGS84_EPSG_ID)
+
+    dates = []
+    for date_text in itertools.chain.from_iterable(periods):
+        try:
+            dates.append(datetime.date.fromisoformat(str(date_text)[:10]))
+        except (TypeError, ValueError):
+            pass
+    if dates:
+        extent['tbox'] = [min(dates).strftime(output_time_format), max(dates).strftime(output_time_format)]
+
+    return extent if extent else None
+
+
 def transform_bbox(x):
     """
     Function purpose: Transform bounding box (str) into geometry
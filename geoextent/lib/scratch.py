@@ -0,0 +1,148 @@
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from . import helpfunctions as hf
+
+logger = logging.getLogger("geoextent")
+
+
+class ExtractionError(Exception):
+    """Raised when an archive or archive member cannot be extracted to a ScratchArea"""
+
+
+class DiskQuotaExceeded(ExtractionError):
+    """Raised when an extraction would use more than the quota of a ScratchArea"""
+
+
+def _folder_size(folder):
+    return sum(os.path.getsize(os.path.join(root, filename))
+               for root, folders, filenames in os.walk(folder) for filename in filenames)
+
+
+class ScratchArea:
+    """Temporary folder inside scratch_dir the archives and archive members are extracted to, instead of
+    next to the archive, so that read-only folders can be extracted from.
+
+    Every extraction is deleted when its context manager exits, i.e. as soon as the folder or file it
+    provides is summarized, so that nested archives walked depth-first only occupy the extractions of one
+    branch at a time. At most quota bytes are extracted at once, extractions that would exceed the quota
+    raise DiskQuotaExceeded, callers list the left out archives and members in skipped.
+
+    The quota is checked before writing: archives GDAL cannot read are only extracted if their listing declares
+    their uncompressed size (ZIP and tar, also compressed), other formats such as 7z or RAR are skipped when a
+    quota is set. Archives whose declared sizes are lower than their content may exceed the quota while being
+    extracted, they are deleted and skipped right afterwards.
+    """
+
+    def __init__(self, scratch_dir=None, quota=None):
+        if scratch_dir is not None:
+            os.makedirs(scratch_dir, exist_ok=True)
+        self.folder = tempfile.mkdtemp(prefix="geoextent_", dir=scratch_dir)
+        self.quota = quota
+        self.used = 0
+        self.skipped = []
+
+        self._lock = threading.Lock()
+
+    def _reserve(self, size, filename):
+        with self._lock:
+            if self.quota is not None and self.used + size > self.quota:
+                logger.debug("Extracting {} ({} bytes) would exceed the disk quota".format(filename, size))
+                raise DiskQuotaExceeded("disk quota of {} bytes exceeded".format(self.quota))
+            self.used += size
+
+    def _release(self, size):
+        with self._lock:
+            self.used -= size
+
+    def skip(self, filename, size, reason):
+        """
+        Function purpose: list an archive or archive member that was not extracted in skipped
+        Output: the entry added to skipped
+        """
+        logger.warning("Skipping {}: {}".format(filename, reason))
+        entry = {"filename": filename, "size": size, "reason": reason}
+        with self._lock:
+            self.skipped.append(entry)
+        return entry
+
+    @contextlib.contextmanager
+    def open_archive(self, filepath):
+        """
+        Function purpose: make the members of an archive available, through a GDAL virtual file system if possible
+        filepath: filepath to archive
+        Output: virtual folder of the archive, or folder in the scratch area the archive was extracted to,
+        which is deleted afterwards
+        """
+        vsi_path = hf.open_archive(filepath)
+        if vsi_path is not None:
+            yield vsi_path
+            return
+
+        # the uncompressed size is reserved before extracting, the quota cannot be kept for archives whose
+        # listing does not declare it
+        size = hf.archive_size(filepath)
+        if size is None:
+            if self.quota is not None:
+                raise ExtractionError("uncompressed size of the archive is unknown, it is not extracted "
+                                      "with a disk quota")
+            size = 0
+        self._reserve(size, filepath)
+        folder = tempfile.mkdtemp(prefix=os.path.basename(filepath) + "_", dir=self.folder)
+        try:
+            try:
+                hf.extract_archive(filepath, folder)
+            except Exception as e:
+                logger.debug(str(e))
+                raise ExtractionError("archive could not be extracted")
+            # the declared sizes may differ from the extracted files
+            extracted_size = _folder_size(folder)
+            self._release(size)
+            size = 0
+            self._reserve(extracted_size, filepath)
+            size = extracted_size
+            logger.debug("Extracted {} ({} bytes) to {}".format(filepath, extracted_size, folder))
+            yield folder
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+            self._release(size)
+
+    @contextlib.contextmanager
+    def member_on_disk(self, path, filename):
+        """
+        Function purpose: make a member of an archive available on disk if it cannot be read through GDAL
+        path: path of the member inside a GDAL virtual file system, or of a file on disk
+        filename: name of the member, deciding if it is extracted (hf.EXTRACTED_MEMBER_EXTENSIONS)
+        Output: path on disk of a copy of the member in the scratch area, deleted afterwards, or path itself
+        """
+        if not hf.needs_extraction(path, filename):
+            yield path
+            return
+
+        size = hf.member_size(path)
+        self._reserve(size, path)
+        folder = tempfile.mkdtemp(dir=self.folder)
+        try:
+            filepath = os.path.join(folder, filename)
+            try:
+                hf.copy_member(path, filepath)
+            except Exception as e:
+                logger.debug(str(e))
+                raise ExtractionError("member could not be extracted")
+            logger.debug("Extracted {} to {}".format(path, filepath))
+            yield filepath
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+            self._release(size)
+
+    def contains(self, path):
+        """
+        Function purpose: check if a path is inside the scratch area, i.e. an extraction deleted after this run
+        """
+        return os.path.abspath(path).startswith(os.path.abspath(self.folder) + os.sep)
+
+    def close(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(monkeypatch, tmp_path):
+    # keep the CLI from reusing extraction results cached by earlier test runs
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
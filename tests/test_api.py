@@ -1,9 +1,20 @@
+import concurrent.futures
+import json
 import os  # used to get the location of the testdata
+import shutil
 import sys
+import tarfile
 import tempfile
 import urllib.request
+import zipfile
+import numpy as np
 import pytest
 import geoextent.lib.extent as geoextent
+from osgeo import gdal, ogr, osr
+from geoextent.lib.cache import ResultCache
+from geoextent.lib.scratch import DiskQuotaExceeded, ExtractionError, ScratchArea
+from geoextent.lib import handleRaster
+from geoextent.lib import helpfunctions as hf
 from help_functions_test import create_zip, tolerance
 
 
@@ -139,6 +150,37 @@ def test_folder_nested_files():
     assert result["tbox"] == ['2017-04-08', '2020-02-06']
 
 
+def test_folder_nested_files_workers():
+    sequential = geoextent.fromDirectory('tests/testdata/folders/nested_folder', bbox=True, tbox=True, details=True)
+    parallel = geoextent.fromDirectory('tests/testdata/folders/nested_folder', bbox=True, tbox=True, details=True,
+                                       workers=4)
+    assert parallel == sequential
+    assert parallel["bbox"] == pytest.approx([7.601680, 34.7, 142.0, 51.974624], abs=tolerance)
+    assert parallel["tbox"] == ['2017-04-08', '2020-02-06']
+
+
+def test_folder_ending_with_archive_format():
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy("tests/testdata/geojson/muenster_ring_zeit.geojson", tmp)
+        with zipfile.ZipFile(os.path.join(tmp, "z.zip"), "w") as archive:
+            archive.write("tests/testdata/geojson/onePoint.geojson", "onePoint.geojson")
+        for workers in [None, 2]:
+            result = geoextent.fromDirectory(tmp, bbox=True, tbox=True, details=True, workers=workers)
+            assert result["format"] == "folder"
+            assert result["details"]["z.zip"]["format"] == "archive"
+
+
+def test_iter_directory_nested_files():
+    records = list(geoextent.iter_directory('tests/testdata/folders/nested_folder', bbox=True, tbox=True))
+    result = geoextent.fromDirectory('tests/testdata/folders/nested_folder', bbox=True, tbox=True)
+    assert len(records) > 1
+    assert all(os.path.isfile(os.path.join('tests/testdata/folders/nested_folder', r["filename"])) for r in records)
+    merged = records[-1]["merged"]
+    assert merged["bbox"] == pytest.approx(result["bbox"], abs=tolerance)
+    assert merged["crs"] == "4326"
+    assert merged["tbox"] == result["tbox"]
+
+
 def test_zipfile_unsupported_file():
     with tempfile.TemporaryDirectory() as tmp:
         filepath = os.path.join(tmp, "unsupported_file.txt")
@@ -174,6 +216,142 @@ def test_zipfile_nested_folders():
     assert result["tbox"] == ['2017-04-08', '2020-02-06']
 
 
+def test_zipfile_read_without_extracting():
+    folder_name = "tests/testdata/folders/nested_folder"
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "zipfile.zip")
+        create_zip(folder_name, zip_path)
+        outer_zip_path = os.path.join(tmp, "outer.zip")
+        with zipfile.ZipFile(outer_zip_path, "w") as outer_zip:
+            outer_zip.write(zip_path, "zipfile.zip")
+        os.remove(zip_path)
+        result = geoextent.fromDirectory(outer_zip_path, bbox=True, tbox=True)
+        assert os.listdir(tmp) == ["outer.zip"]
+    assert result["bbox"] == pytest.approx([7.601680, 34.7, 142.0, 51.974624], abs=tolerance)
+    assert result["tbox"] == ['2017-04-08', '2020-02-06']
+
+
+def test_tarfile_read_without_extracting():
+    with tempfile.TemporaryDirectory() as tmp:
+        tar_path = os.path.join(tmp, "folder.tar.gz")
+        with tarfile.open(tar_path, "w:gz") as tar:
+            tar.add("tests/testdata/folders/folder_one_file", "folder_one_file")
+        result = geoextent.fromDirectory(tar_path, bbox=True, tbox=True, details=True)
+        assert os.listdir(tmp) == ["folder.tar.gz"]
+    assert list(result["details"]) == ["folder_one_file"]
+    assert result["bbox"] == pytest.approx([7.601680, 51.948814, 7.647256, 51.974624], abs=tolerance)
+    assert result["tbox"] == ['2018-11-14', '2018-11-14']
+
+
+def test_zipfile_disk_quota():
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "zipfile.zip")
+        create_zip("tests/testdata/folders/nested_folder", zip_path)
+        outer_zip_path = os.path.join(tmp, "outer.zip")
+        with zipfile.ZipFile(outer_zip_path, "w") as outer_zip:
+            outer_zip.write(zip_path, "zipfile.zip")
+            outer_zip.write("tests/testdata/folders/folder_one_file/muenster_ring_zeit.geojson", "ring.geojson")
+        scratch = ScratchArea(os.path.join(tmp, "scratch"), quota=100)
+        result = geoextent.fromDirectory(outer_zip_path, bbox=True, tbox=True, scratch=scratch)
+        assert os.listdir(scratch.folder) == []
+        scratch.close()
+    assert result["bbox"] == pytest.approx([7.601680, 51.948814, 7.647256, 51.974624], abs=tolerance)
+    assert [(f["filename"], f["reason"]) for f in result["skipped_files"]] == [
+        ("/vsizip/" + outer_zip_path + "/zipfile.zip", "disk quota of 100 bytes exceeded")]
+
+
+def test_iter_directory_reports_skipped_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "zipfile.zip")
+        create_zip("tests/testdata/folders/nested_folder", zip_path)
+        outer_zip_path = os.path.join(tmp, "outer.zip")
+        with zipfile.ZipFile(outer_zip_path, "w") as outer_zip:
+            outer_zip.write(zip_path, "zipfile.zip")
+            outer_zip.write("tests/testdata/folders/folder_one_file/muenster_ring_zeit.geojson", "ring.geojson")
+        scratch = ScratchArea(os.path.join(tmp, "scratch"), quota=100)
+        records = list(geoextent.iter_directory(outer_zip_path, bbox=True, tbox=True, scratch=scratch))
+        scratch.close()
+    skipped = {r["filename"]: r["skipped"] for r in records if "skipped" in r}
+    assert list(skipped) == ["zipfile.zip"]
+    assert skipped["zipfile.zip"]["reason"] == "disk quota of 100 bytes exceeded"
+    assert records[-1]["merged"]["bbox"] == pytest.approx([7.601680, 51.948814, 7.647256, 51.974624], abs=tolerance)
+
+
+def test_scratch_area_checks_uncompressed_size_before_extracting():
+    with tempfile.TemporaryDirectory() as tmp:
+        archive_path = os.path.join(tmp, "zeros.tar.bz2")
+        zeros_path = os.path.join(tmp, "zeros.bin")
+        with open(zeros_path, "wb") as f:
+            f.write(bytes(1000000))
+        with tarfile.open(archive_path, "w:bz2") as tar:
+            tar.add(zeros_path, "zeros.bin")
+        unknown_path = os.path.join(tmp, "unknown.7z")
+        with open(unknown_path, "wb") as f:
+            f.write(b"7z")
+        scratch = ScratchArea(os.path.join(tmp, "scratch"), quota=100000)
+        assert os.path.getsize(archive_path) < scratch.quota
+        with pytest.raises(DiskQuotaExceeded):
+            with scratch.open_archive(archive_path):
+                pass
+        with pytest.raises(ExtractionError, match="uncompressed size of the archive is unknown"):
+            with scratch.open_archive(unknown_path):
+                pass
+        assert scratch.used == 0
+        assert os.listdir(scratch.folder) == []
+        scratch.close()
+
+
+def test_scratch_area_deletes_extractions():
+    with tempfile.TemporaryDirectory() as tmp:
+        archive_path = os.path.join(tmp, "folder.tar.bz2")
+        with tarfile.open(archive_path, "w:bz2") as tar:
+            tar.add("tests/testdata/folders/folder_one_file", "folder_one_file")
+        scratch = ScratchArea(os.path.join(tmp, "scratch"))
+        with scratch.open_archive(archive_path) as folder:
+            assert os.listdir(folder) == ["folder_one_file"]
+            assert scratch.used == os.path.getsize("tests/testdata/folders/folder_one_file/muenster_ring_zeit.geojson")
+        assert scratch.used == 0
+        assert os.listdir(scratch.folder) == []
+
+        scratch.quota = 10
+        with pytest.raises(DiskQuotaExceeded):
+            with scratch.open_archive(archive_path):
+                pass
+        assert os.listdir(scratch.folder) == []
+        assert sorted(os.listdir(tmp)) == ["folder.tar.bz2", "scratch"]
+        scratch.close()
+
+
+def test_corrupt_archive_is_skipped():
+    with tempfile.TemporaryDirectory() as tmp:
+        archive_path = os.path.join(tmp, "corrupt.tar.bz2")
+        with open(archive_path, "wb") as f:
+            f.write(b"not an archive")
+        for workers in [None, 2]:
+            result = geoextent.fromDirectory(archive_path, bbox=True, tbox=True, workers=workers)
+            assert "bbox" not in result
+            assert result["skipped_files"] == [{"filename": archive_path, "size": 14,
+                                                "reason": "archive could not be extracted"}]
+        records = list(geoextent.iter_directory(archive_path, bbox=True, tbox=True))
+        assert [record["filename"] for record in records] == ["corrupt.tar.bz2"]
+        assert records[0]["skipped"]["reason"] == "archive could not be extracted"
+
+        # an exceeded quota is not a partial result
+        with tarfile.open(archive_path, "w:bz2") as tar:
+            tar.add("tests/testdata/folders/folder_one_file", "folder_one_file")
+        scratch = ScratchArea(os.path.join(tmp, "scratch"), quota=10)
+        with pytest.raises(DiskQuotaExceeded):
+            geoextent.fromDirectory(archive_path, bbox=True, tbox=True, scratch=scratch)
+        scratch.close()
+
+
+def test_archive_vsi_path():
+    assert hf.archive_vsi_path("a/b.zip") == "/vsizip/" + os.path.abspath("a/b.zip")
+    assert hf.archive_vsi_path("b.tar.gz").startswith("/vsitar/")
+    assert hf.archive_vsi_path("b.geojson.gz").startswith("/vsigzip/")
+    assert hf.archive_vsi_path("b.7z") is None
+
+
 def test_png_file_extract_bbox():
     with tempfile.TemporaryDirectory() as tmp:
         url = 'https://zenodo.org/record/820562/files/20160100_Hpakan_20151123_PRE.png?download=1'
@@ -217,7 +395,7 @@ def test_gml_extract_bbox_time():
 
 def test_jpge_2000_extract_bbox():
     result = geoextent.fromFile("tests/testdata/jpge2000/MSK_SNWPRB_60m.jp2", bbox=True)
-    assert result['bbox'] == pytest.approx([-74.09868, 4.434354, -73.10649, 5.425259], abs=tolerance)
+    assert result['bbox'] == pytest.approx([-74.09868, 4.432483, -73.10649, 5.427551], abs=tolerance)
     assert result['crs'] == "4326"
 
 
@@ -247,3 +425,285 @@ def test_invalid_bbox_and_flip():
     result = geoextent.fromFile('tests/testdata/csv/cities_NL_case_flip.csv', bbox=True)
     assert result['bbox'] == pytest.approx([4.3175, 5.0, 95.0, 53.217222], abs=tolerance)
     assert result['crs'] == "4326"
+
+
+@pytest.mark.parametrize("filepath", ["tests/testdata/geopackage/wandelroute_maastricht.gpkg",
+                                      "tests/testdata/tif/wf_100m_klas.tif",
+                                      "tests/testdata/csv/cities_NL.csv"])
+def test_file_opened_once_with_gdal(monkeypatch, filepath):
+    opened = []
+
+    def counting(open_function):
+        def wrapper(*args, **kwargs):
+            opened.append(args[0])
+            return open_function(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(gdal, "OpenEx", counting(gdal.OpenEx))
+    monkeypatch.setattr(gdal, "Open", counting(gdal.Open))
+    monkeypatch.setattr(ogr, "Open", counting(ogr.Open))
+
+    result = geoextent.fromFile(filepath, bbox=True, tbox=True)
+    assert "bbox" in result
+    assert opened == [filepath]
+
+
+def test_file_result_cache(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as cache_dir:
+        cache = ResultCache(cache_dir)
+        filepath = os.path.join(tmp, "muenster_ring_zeit.geojson")
+        shutil.copy("tests/testdata/geojson/muenster_ring_zeit.geojson", filepath)
+        result = geoextent.fromFile(filepath, bbox=True, tbox=True, cache=cache)
+
+        with monkeypatch.context() as m:
+            m.setattr(gdal, "OpenEx", lambda *args, **kwargs: pytest.fail("cached file must not be opened"))
+            assert geoextent.fromFile(filepath, bbox=True, tbox=True, cache=cache) == result
+            assert geoextent.fromDirectory(tmp, bbox=True, tbox=True, details=True, cache=cache)["details"][
+                       "muenster_ring_zeit.geojson"] == result
+
+        # changed files and other extraction options are extracted again
+        assert geoextent.fromFile(filepath, bbox=True, tbox=False, cache=cache) == {
+            k: v for k, v in result.items() if k != "tbox"}
+        shutil.copy("tests/testdata/geojson/onePoint.geojson", filepath)
+        assert geoextent.fromFile(filepath, bbox=True, tbox=True, cache=cache)["bbox"] != result["bbox"]
+        cache.close()
+
+
+def test_file_result_cache_skips_archive_members():
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as cache_dir:
+        cache = ResultCache(cache_dir)
+        shutil.copy("tests/testdata/geojson/muenster_ring_zeit.geojson", tmp)
+        with zipfile.ZipFile(os.path.join(tmp, "archive.zip"), "w") as archive:
+            archive.write("tests/testdata/geojson/onePoint.geojson", "onePoint.geojson")
+
+        geoextent.fromDirectory(tmp, bbox=True, tbox=True, cache=cache)
+        geoextent.fromDirectory(tmp, bbox=True, tbox=True, cache=cache, workers=2)
+        list(geoextent.iter_directory(tmp, bbox=True, tbox=True, cache=cache))
+        # members of archives get a new path in every run, only the plain file is stored
+        assert cache._entries == 1
+        cache.close()
+
+
+def test_file_result_cache_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(tmp, max_entries=10)
+        for i in range(25):
+            filepath = os.path.join(tmp, "{}.txt".format(i))
+            open(filepath, "w").close()
+            cache.put(filepath, True, False, None, None)
+        assert cache.get(os.path.join(tmp, "24.txt"), True, False) == (True, None)
+        assert cache.get(os.path.join(tmp, "0.txt"), True, False) == (False, None)
+        assert cache._entries <= 10
+        cache.close()
+
+
+def test_coordinate_transformation_cached():
+    with hf.coordinate_transformation("32632") as transform:
+        point = transform.TransformPoint(500000, 5700000)
+    with hf.coordinate_transformation(32632, hf.WGS84_EPSG_ID) as cached_transform:
+        assert cached_transform is transform
+        assert cached_transform.TransformPoint(500000, 5700000) == point
+    assert hf.get_spatial_reference("4326") is hf.get_spatial_reference(4326)
+
+
+def test_coordinate_transformation_new_pairs_concurrently():
+    # building a transformation looks up its spatial references in the same cache
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(hf.transform_points, [[500000, 5700000]], crs, traditional_gis_order=True)
+                   for crs in [32631, 32632, 32633, 32634] * 2]
+        results = [future.result(timeout=60) for future in futures]
+    assert results[1][0] == pytest.approx([9.0, 51.451182], abs=tolerance)
+
+
+def test_transform_points_batch():
+    points = np.array([[500000, 5700000], [600000, 5800000], [400000, 5600000]])
+    transformed = hf.transform_points(points, 32632)
+    assert transformed.shape == (3, 2)
+    for point, expected in zip(points, transformed):
+        geometry = ogr.CreateGeometryFromWkt("POINT ({} {})".format(*point))
+        with hf.coordinate_transformation(32632) as transform:
+            geometry.Transform(transform)
+        assert [geometry.GetX(), geometry.GetY()] == pytest.approx(expected.tolist())
+    assert hf.transformingArrayIntoWGS84("32632", points.tolist()) == transformed.tolist()
+
+
+def test_transform_points_axis_order():
+    points = [[500000, 5700000], [700000, 5300000]]
+    # EPSG:4326 has latitude first, as returned by transformingIntoWGS84
+    authority_order = hf.transform_points(points, 32632)
+    assert authority_order[0] == pytest.approx([51.451182, 9.0], abs=tolerance)
+    assert authority_order[1] == pytest.approx([47.822236, 11.672055], abs=tolerance)
+    assert hf.transformingIntoWGS84(32632, points[0]) == pytest.approx(authority_order[0].tolist())
+    # x, y order in both CRS, like the geotransform of a raster
+    traditional_order = hf.transform_points(points, 32632, traditional_gis_order=True)
+    assert traditional_order == pytest.approx(authority_order[:, ::-1])
+    back = hf.transform_points(traditional_order, hf.WGS84_EPSG_ID, 32632, traditional_gis_order=True)
+    assert back == pytest.approx(np.array(points, dtype=float), abs=0.01)
+
+
+def test_decode_cf_time():
+    dates = hf.decode_cf_time([0, 31, 59, 9.96921e36], "days since 2000-01-01 00:00:00")
+    assert [d.strftime("%Y-%m-%d") for d in dates] == ['2000-01-01', '2000-02-01', '2000-02-29']
+    assert hf.decode_cf_time([6], "hours since 1970-1-1 00:00:00 UTC")[0].hour == 6
+    assert hf.decode_cf_time([1], "degrees_north") is None
+
+
+def test_netcdf_extract_time_dimension():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = gdal.GetDriverByName("MEM").Create("", 4, 4, 3, gdal.GDT_Byte)
+        source.SetGeoTransform([7, 0.25, 0, 52, 0, -0.25])
+        source.SetProjection(hf.get_spatial_reference(4326).ExportToWkt())
+        source.SetMetadata({"NETCDF_DIM_EXTRA": "{time}", "NETCDF_DIM_time_DEF": "{3,6}",
+                            "NETCDF_DIM_time_VALUES": "{0,31,59}", "time#units": "days since 2000-01-01 00:00:00"})
+        filepath = os.path.join(tmp, "time.nc")
+        gdal.GetDriverByName("netCDF").CreateCopy(filepath, source)
+        result = geoextent.fromFile(filepath, bbox=True, tbox=True)
+    assert result["tbox"] == ['2000-01-01', '2000-02-29']
+
+
+def test_netcdf_subdatasets_extract_bbox():
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "variables.nc")
+        source = gdal.GetDriverByName("MEM").Create("", 4, 4, 1, gdal.GDT_Byte)
+        source.SetGeoTransform([7, 0.25, 0, 52, 0, -0.25])
+        source.SetProjection(hf.get_spatial_reference(4326).ExportToWkt())
+        gdal.GetDriverByName("netCDF").CreateCopy(filepath, source, options=["VARIABLE_NAME=a"])
+        gdal.GetDriverByName("netCDF").CreateCopy(filepath, source, options=["VARIABLE_NAME=b",
+                                                                             "APPEND_SUBDATASET=YES"])
+        assert gdal.Open(filepath).RasterCount == 0
+        result = geoextent.fromFile(filepath, bbox=True)
+        first_only = handleRaster.getBoundingBox(filepath, first_subdataset_only=True)
+    assert result["geoextent_handler"] == "handleRaster"
+    assert result["bbox"] == pytest.approx([7.0, 51.0, 8.0, 52.0], abs=tolerance)
+    assert first_only["bbox"] == pytest.approx(result["bbox"], abs=tolerance)
+
+
+def _write_zarr_array(store, name, dimensions, values, attributes=None):
+    values = np.asarray(values, dtype="<f8")
+    os.makedirs(os.path.join(store, name))
+    with open(os.path.join(store, name, ".zarray"), "w") as f:
+        json.dump({"zarr_format": 2, "shape": list(values.shape), "chunks": list(values.shape), "dtype": "<f8",
+                   "compressor": None, "fill_value": None, "filters": None, "order": "C"}, f)
+    with open(os.path.join(store, name, ".zattrs"), "w") as f:
+        json.dump({"_ARRAY_DIMENSIONS": dimensions, **(attributes or {})}, f)
+    with open(os.path.join(store, name, ".".join(["0"] * values.ndim)), "wb") as f:
+        f.write(values.tobytes())
+
+
+def _write_zarr_store(store):
+    os.makedirs(store)
+    with open(os.path.join(store, ".zgroup"), "w") as f:
+        json.dump({"zarr_format": 2}, f)
+    _write_zarr_array(store, "time", ["time"], [0, 31, 59], {"units": "days since 2000-01-01"})
+    _write_zarr_array(store, "lat", ["lat"], [51.125, 51.375, 51.625, 51.875], {"units": "degrees_north"})
+    _write_zarr_array(store, "lon", ["lon"], [7.125, 7.375, 7.625, 7.875], {"units": "degrees_east"})
+    _write_zarr_array(store, "t2m", ["time", "lat", "lon"], np.zeros((3, 4, 4)))
+
+
+def test_is_zarr_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_zarr_store(os.path.join(tmp, "store.zarr"))
+        assert hf.is_zarr_store(os.path.join(tmp, "store.zarr"))
+        assert not hf.is_zarr_store(tmp)
+        assert not hf.is_zarr_store(os.path.join(tmp, "store.zarr", ".zgroup"))
+
+
+def test_zarr_store_extract_as_one_dataset():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_zarr_store(os.path.join(tmp, "store.zarr"))
+        result = geoextent.fromDirectory(tmp, bbox=True, tbox=True, details=True)
+    assert list(result["details"]) == ["store.zarr"]
+    assert result["details"]["store.zarr"]["geoextent_handler"] == "handleMultidim"
+    assert result["bbox"] == pytest.approx([7.0, 51.0, 8.0, 52.0], abs=tolerance)
+    assert result["tbox"] == ['2000-01-01', '2000-02-29']
+
+
+def test_netcdf_coordinate_variables_extract_bbox():
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "grid.nc")
+        dataset = gdal.GetDriverByName("netCDF").CreateMultiDimensional(filepath)
+        root = dataset.GetRootGroup()
+        float64 = gdal.ExtendedDataType.Create(gdal.GDT_Float64)
+        dimensions = {}
+        for name, values, units in [("lat", [51.125, 51.375, 51.625, 51.875], "degrees_north"),
+                                    ("lon", [7.125, 7.375, 7.625, 7.875], "degrees_east")]:
+            dimension = root.CreateDimension(name, None, None, len(values))
+            variable = root.CreateMDArray(name, [dimension], float64)
+            variable.Write(np.array(values))
+            variable.SetUnit(units)
+            dimension.SetIndexingVariable(variable)
+            dimensions[name] = dimension
+        root.CreateMDArray("t2m", [dimensions["lat"], dimensions["lon"]], float64)
+        dataset = None
+        result = geoextent.fromFile(filepath, bbox=True, tbox=False)
+    assert result["geoextent_handler"] == "handleMultidim"
+    assert result["bbox"] == pytest.approx([7.0, 51.0, 8.0, 52.0], abs=tolerance)
+
+
+def test_zarr_store_global_grid_clamps_bbox():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = os.path.join(tmp, "global.zarr")
+        os.makedirs(store)
+        with open(os.path.join(store, ".zgroup"), "w") as f:
+            json.dump({"zarr_format": 2}, f)
+        latitudes = np.arange(90, -90.125, -0.25)
+        longitudes = np.arange(0, 360, 0.25)
+        _write_zarr_array(store, "latitude", ["latitude"], latitudes, {"units": "degrees_north"})
+        _write_zarr_array(store, "longitude", ["longitude"], longitudes, {"units": "degrees_east"})
+        _write_zarr_array(store, "t2m", ["latitude", "longitude"], np.zeros((len(latitudes), len(longitudes))))
+        result = geoextent.fromFile(store, bbox=True, tbox=False)
+    assert result["geoextent_handler"] == "handleMultidim"
+    assert result["bbox"] == pytest.approx([-180, -90, 180, 90], abs=tolerance)
+
+
+def _bbox_merge_per_box(metadata):
+    # reference: every box transformed on its own, like the merge through an OGR multipolygon
+    target = osr.SpatialReference()
+    target.ImportFromEPSG(hf.WGS84_EPSG_ID)
+    corners = []
+    for y in metadata.values():
+        if not isinstance(y, dict) or "bbox" not in y or "crs" not in y:
+            continue
+        b = y["bbox"]
+        box = [(b[0], b[1]), (b[2], b[1]), (b[2], b[3]), (b[0], b[3])]
+        if y["crs"] != str(hf.WGS84_EPSG_ID):
+            source = osr.SpatialReference()
+            try:
+                source.ImportFromEPSG(int(y["crs"]))
+            except Exception:
+                continue
+            transform = osr.CoordinateTransformation(source, target)
+            box = [transform.TransformPoint(*corner)[:2] for corner in box]
+        corners.extend(box)
+    return [min(c[0] for c in corners), min(c[1] for c in corners),
+            max(c[0] for c in corners), max(c[1] for c in corners)]
+
+
+def test_bbox_merge_multiple_crs():
+    metadata = {
+        "utm32.tif": {"bbox": [500000, 5700000, 600000, 5800000], "crs": "32632"},
+        "utm33.tif": {"bbox": [300000, 5700000, 400000, 5800000], "crs": "32633"},
+        "utm32_2.shp": {"bbox": [400000, 5600000, 450000, 5650000], "crs": "32632"},
+        "wgs84.geojson": {"bbox": [7.0, 50.0, 8.0, 51.0], "crs": "4326"},
+        "invalid_crs.gpkg": {"bbox": [7.0, 50.0, 8.0, 51.0], "crs": "999999"},
+        "no_crs.csv": {"bbox": [7.0, 50.0, 8.0, 51.0]},
+        "unsupported.txt": None,
+    }
+    result = hf.bbox_merge(metadata, "folder")
+    assert result["crs"] == "4326"
+    assert result["bbox"] == pytest.approx(_bbox_merge_per_box(metadata))
+    assert hf.bbox_merge({"no_crs.csv": metadata["no_crs.csv"]}, "folder") is None
+
+
+def test_bbox_merge_antimeridian():
+    metadata = {
+        # UTM zone 60N reaches across the antimeridian east of 834000
+        "utm60.tif": {"bbox": [700000, 5700000, 900000, 5800000], "crs": "32660"},
+        "utm1.tif": {"bbox": [200000, 5700000, 300000, 5800000], "crs": "32601"},
+        "east.geojson": {"bbox": [178.0, 50.0, 179.5, 51.0], "crs": "4326"},
+        "west.geojson": {"bbox": [-179.5, 50.0, -178.0, 51.0], "crs": "4326"},
+    }
+    result = hf.bbox_merge(metadata, "folder")
+    assert result["bbox"] == pytest.approx(_bbox_merge_per_box(metadata))
+    wgs84_only = {name: y for name, y in metadata.items() if y["crs"] == "4326"}
+    assert hf.bbox_merge(wgs84_only, "folder")["bbox"] == pytest.approx([-179.5, 50.0, 179.5, 51.0])
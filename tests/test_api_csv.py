@@ -1,6 +1,8 @@
+import pandas as pd
 import pytest
 from help_functions_test import tolerance
 import geoextent.lib.extent as geoextent
+from geoextent.lib import handleCSV
 
 
 def test_csv_extract_bbox():
@@ -219,3 +221,57 @@ def test_csv_extract_tbox_random_sample_value_larger_than_data():
     assert "crs" not in result
     assert "tbox" in result
     assert result["tbox"] == ['2017-04-08', '2020-02-06']
+
+
+def test_csv_bbox_chunked():
+    bbox = handleCSV.getBoundingBox('tests/testdata/csv/3DCMTcatalog_TakemuraEPS.csv')
+    assert handleCSV.getBoundingBox('tests/testdata/csv/3DCMTcatalog_TakemuraEPS.csv', chunk_size=3) == bbox
+    assert bbox["bbox"] == pytest.approx([138.5, 34.7, 142.0, 37.8], abs=tolerance)
+
+
+def test_csv_bbox_values_with_spaces(tmp_path):
+    filepath = tmp_path / "spaces.csv"
+    filepath.write_text("name,lat,lon\na,51. 5,7.1\nb,52.0,not a number\nc,50.25,7 .5\n")
+    result = geoextent.fromFile(str(filepath), bbox=True)
+    assert result["bbox"] == pytest.approx([7.1, 50.25, 7.5, 52.0], abs=tolerance)
+
+
+def test_csv_bbox_and_tbox_single_read(monkeypatch):
+    reads = []
+    read_csv = pd.read_csv
+
+    def counting_read_csv(*args, **kwargs):
+        reads.append(args[0])
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", counting_read_csv)
+    result = geoextent.fromFile('tests/testdata/csv/cities_NL.csv', bbox=True, tbox=True)
+    assert result["bbox"] == pytest.approx([4.3175, 51.434444, 6.574722, 53.217222], abs=tolerance)
+    assert result["tbox"] == ['2017-08-01', '2019-09-30']
+    assert len(reads) == 1
+
+
+def test_csv_tbox_chunked():
+    scan = handleCSV.CSVScan('tests/testdata/csv/3DCMTcatalog_TakemuraEPS.csv', bbox=False, tbox=True, chunk_size=4)
+    result = handleCSV.getTemporalExtent('tests/testdata/csv/3DCMTcatalog_TakemuraEPS.csv', None, dataset=scan)
+    assert result == ['2017-04-08', '2020-02-06']
+
+
+def test_csv_tbox_time_column_empty_in_first_chunk(tmp_path):
+    filepath = tmp_path / "late_time.csv"
+    rows = ["{},51.{},7.{},".format(i, i, i) for i in range(1, 5)]
+    rows += ["{},51.{},7.{},2019-0{}-15".format(i, i, i, i) for i in range(5, 9)]
+    filepath.write_text("id,lat,lon,date\n" + "\n".join(rows) + "\n")
+    scan = handleCSV.CSVScan(str(filepath), bbox=False, tbox=True, chunk_size=4)
+    result = handleCSV.getTemporalExtent(str(filepath), None, dataset=scan)
+    assert result == ['2019-05-15', '2019-08-15']
+
+
+def test_csv_tbox_time_format_changes_after_first_chunk(tmp_path):
+    filepath = tmp_path / "changed_time_format.csv"
+    rows = ["{},51.{},7.{},2019-01-0{}".format(i, i, i, i) for i in range(1, 5)]
+    rows += ["{},51.{},7.{},2{}.02.2020".format(i, i, i, i) for i in range(5, 9)]
+    filepath.write_text("id,lat,lon,date\n" + "\n".join(rows) + "\n")
+    scan = handleCSV.CSVScan(str(filepath), bbox=False, tbox=True, chunk_size=4)
+    result = handleCSV.getTemporalExtent(str(filepath), None, dataset=scan)
+    assert result == ['2019-01-01', '2020-02-28']
@@ -1,5 +1,9 @@
+import os
+import tempfile
 import geoextent.lib.extent as geoextent
+from geoextent.lib import handleRaster
 from help_functions_test import tolerance
+from osgeo import gdal, osr
 import pytest
 
 
@@ -7,7 +11,7 @@ def test_geotiff_extract_bbox():
     result = geoextent.fromFile('tests/testdata/tif/wf_100m_klas.tif', bbox=True)
     assert "bbox" in result
     assert "crs" in result
-    assert result["bbox"] == pytest.approx([5.915300, 50.310251, 9.468398, 52.530775], abs=tolerance)
+    assert result["bbox"] == pytest.approx([5.765119, 50.310251, 9.468398, 52.531670], abs=tolerance)
     assert result["crs"] == "4326"
 
 
@@ -20,3 +24,61 @@ def test_geotiff_crs_used():
     result = geoextent.fromFile('tests/testdata/tif/wf_100m_klas.tif', bbox=True)
     assert "crs" in result
     assert result["crs"] == '4326'
+
+
+def test_geotiff_extract_bbox_corners_only():
+    result = handleRaster.getBoundingBox('tests/testdata/tif/wf_100m_klas.tif', edge_points=2)
+    # all four corners: the western bound comes from the upper left corner, the northern bound lies between the
+    # upper corners and is only reached with more edge points
+    assert result["bbox"] == pytest.approx([5.765119, 50.310252, 9.468399, 52.530776], abs=tolerance)
+
+
+def test_raster_edge_points_setting():
+    assert handleRaster._edge_points_setting(None) == handleRaster.DEFAULT_EDGE_POINTS
+    assert handleRaster._edge_points_setting("5") == 5
+    assert handleRaster._edge_points_setting("1") == handleRaster.DEFAULT_EDGE_POINTS
+    assert handleRaster._edge_points_setting("many") == handleRaster.DEFAULT_EDGE_POINTS
+    with pytest.raises(Exception):
+        handleRaster.getBoundingBox('tests/testdata/tif/wf_100m_klas.tif', edge_points=1)
+
+
+def test_geotiff_polar_stereographic_extract_bbox():
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "polar.tif")
+        dataset = gdal.GetDriverByName("GTiff").Create(filepath, 10, 10, 1, gdal.GDT_Byte)
+        dataset.SetGeoTransform([-1000000, 200000, 0, 1000000, 0, -200000])
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(3413)
+        dataset.SetProjection(srs.ExportToWkt())
+        dataset = None
+        result = geoextent.fromFile(filepath, bbox=True)
+    # the raster contains the north pole, which none of its edges reach
+    assert result["bbox"][0] == -180
+    assert result["bbox"][2] == 180
+    assert result["bbox"][3] == 90
+    assert 70 < result["bbox"][1] < 80
+
+
+def test_geotiff_geographic_crs_at_equator_contains_no_pole():
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "equator.tif")
+        dataset = gdal.GetDriverByName("GTiff").Create(filepath, 10, 10, 1, gdal.GDT_Byte)
+        dataset.SetGeoTransform([85, 1, 0, 5, 0, -1])
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(4326)
+        dataset.SetProjection(srs.ExportToWkt())
+        dataset = None
+        result = geoextent.fromFile(filepath, bbox=True)
+    # (90, 0) is inside the raster, but it is not the north pole
+    assert result["bbox"] == pytest.approx([85, -5, 95, 5], abs=tolerance)
+
+
+def test_geotiff_extract_time_from_datetime_tag():
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "datetime.tif")
+        dataset = gdal.GetDriverByName("GTiff").Create(filepath, 10, 10, 1, gdal.GDT_Byte)
+        dataset.SetGeoTransform([7, 0.1, 0, 52, 0, -0.1])
+        dataset.SetMetadataItem("TIFFTAG_DATETIME", "2019:05:31 10:12:00")
+        dataset = None
+        result = geoextent.fromFile(filepath, tbox=True)
+    assert result["tbox"] == ['2019-05-31', '2019-05-31']
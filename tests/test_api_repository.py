@@ -0,0 +1,467 @@
+import functools
+import hashlib
+import http.server
+import os
+import re
+import tempfile
+import threading
+import time
+import pytest
+import geoextent.lib.extent as geoextent
+from geoextent.lib.cache import DoiCache, DownloadStore
+from geoextent.lib.content_providers import Dryad, Figshare, Zenodo, providers
+from help_functions_test import tolerance
+
+
+class _SlowHandler(http.server.BaseHTTPRequestHandler):
+    delay = 0.2
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        time.sleep(self.delay)
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def file_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    server.lock = threading.Lock()
+    server.active = 0
+    server.max_active = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class _QuietFileHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _RangeFileHandler(_QuietFileHandler):
+    """Serves files with support for single HTTP byte ranges, counting the bytes sent"""
+
+    def send_head(self):
+        self.range = None
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        path = self.translate_path(self.path)
+        if match is None or not os.path.isfile(path):
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+        self.range = (start, end)
+        self.send_response(206)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end, size))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return open(path, "rb")
+
+    def copyfile(self, source, outputfile):
+        if self.range is None:
+            data = source.read()
+        else:
+            source.seek(self.range[0])
+            data = source.read(self.range[1] - self.range[0] + 1)
+        self.server.bytes_sent += len(data)
+        outputfile.write(data)
+
+
+@pytest.fixture
+def range_server():
+    handler = functools.partial(_RangeFileHandler, directory="tests/testdata")
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.bytes_sent = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def testdata_server():
+    handler = functools.partial(_QuietFileHandler, directory="tests/testdata")
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+class _LocalProvider(providers.DoiProvider):
+    def __init__(self, url, filenames):
+        super().__init__()
+        self.files = [("{}/{}".format(url, filename), filename) for filename in filenames]
+
+    def download(self, folder, throttle=False, on_download=None):
+        files = [(link, os.path.join(folder, os.path.basename(filename))) for link, filename in self.files]
+        self._download_files(files, throttle=throttle, on_download=on_download)
+
+
+def test_download_files_concurrently(file_server):
+    url = "http://127.0.0.1:{}".format(file_server.server_port)
+    repository = Zenodo.Zenodo()
+    repository.download_workers = 3
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [("{}/file{}".format(url, i), os.path.join(tmp, "sub", "file{}".format(i))) for i in range(6)]
+        repository._download_files(files)
+        for i in range(6):
+            with open(os.path.join(tmp, "sub", "file{}".format(i))) as f:
+                assert f.read() == "/file{}".format(i)
+    assert file_server.max_active == 3
+
+
+def test_download_files_one_worker(file_server):
+    url = "http://127.0.0.1:{}".format(file_server.server_port)
+    repository = Zenodo.Zenodo()
+    repository.download_workers = 1
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [("{}/file{}".format(url, i), os.path.join(tmp, "file{}".format(i))) for i in range(3)]
+        repository._download_files(files)
+        assert sorted(os.listdir(tmp)) == ["file0", "file1", "file2"]
+    assert file_server.max_active == 1
+
+
+class _Response:
+    def __init__(self, url, status_code=200, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+def test_doi_resolved_once(monkeypatch):
+    requests = []
+
+    def request(self, url, throttle=False, **kwargs):
+        requests.append(url)
+        return _Response("https://zenodo.org/records/820562")
+
+    monkeypatch.setattr(providers.DoiProvider, "_request", request)
+    resolved_dois = {}
+    resolver = providers.DoiProvider()
+    resolver.resolved_dois = resolved_dois
+    url = resolver.resolve("10.5281/zenodo.820562")
+    assert url == "https://zenodo.org/records/820562"
+    for h in [Dryad.Dryad, Figshare.Figshare, Zenodo.Zenodo]:
+        repository = h()
+        repository.resolved_dois = resolved_dois
+        assert repository.validate_provider("10.5281/zenodo.820562") == (h is Zenodo.Zenodo)
+    assert repository.record_id == "820562"
+    assert requests == ["https://doi.org/10.5281/zenodo.820562"]
+
+    # providers not sharing the resolutions resolve again
+    assert providers.DoiProvider().resolve("10.5281/zenodo.820562") == url
+    assert len(requests) == 2
+
+
+def test_doi_cache_ttl(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        doi_cache = DoiCache(tmp)
+        doi_cache.put("10.5281/zenodo.820562", "https://zenodo.org/records/820562")
+
+        def request(self, url, throttle=False, **kwargs):
+            raise AssertionError("DOI resolved again")
+
+        monkeypatch.setattr(providers.DoiProvider, "_request", request)
+        resolver = providers.DoiProvider()
+        resolver.doi_cache = doi_cache
+        assert resolver.resolve("10.5281/ZENODO.820562") == "https://zenodo.org/records/820562"
+
+        doi_cache.ttl = -1
+        assert doi_cache.get("10.5281/zenodo.820562") is None
+        doi_cache.close()
+
+
+def test_download_files_groups(testdata_server):
+    filenames = ["shapefile/ifgi_denkpause." + extension for extension in ["dbf", "prj", "qpj", "shp", "shx"]]
+    repository = _LocalProvider(testdata_server, filenames + ["tif/wf_100m_klas.tif"])
+    groups = []
+
+    def on_download(filepaths):
+        groups.append(sorted(os.path.basename(filepath) for filepath in filepaths))
+        assert all(os.path.exists(filepath) for filepath in filepaths)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repository.download(tmp, on_download=on_download)
+    assert sorted(groups) == [[os.path.basename(filename) for filename in filenames], ["wf_100m_klas.tif"]]
+
+
+def test_download_files_stop(testdata_server):
+    filenames = ["geojson/onePoint.geojson", "geojson/empty.geojson", "geojson/falsetime.geojson"]
+    repository = _LocalProvider(testdata_server, filenames)
+    repository.download_workers = 1
+    groups = []
+
+    def on_download(filepaths):
+        groups.append(filepaths)
+        return False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repository.download(tmp, on_download=on_download)
+    assert len(groups) == 1
+
+
+def test_extract_while_downloading(testdata_server):
+    filenames = ["folders/folder_two_files/districtes.geojson", "folders/folder_two_files/muenster_ring_zeit.geojson"]
+    repository = _LocalProvider(testdata_server, filenames)
+    with tempfile.TemporaryDirectory() as tmp:
+        result = geoextent._fromDownloads(repository, tmp, bbox=True, tbox=True, details=True)
+        assert os.listdir(tmp) == []
+    assert result["bbox"] == pytest.approx([2.052333, 41.317038, 7.647256, 51.974624], abs=tolerance)
+    assert result["crs"] == "4326"
+    assert result["tbox"] == ['2018-11-14', '2019-09-11']
+    assert sorted(result["details"]) == ["districtes.geojson", "muenster_ring_zeit.geojson"]
+
+
+def test_remote_file_extract_bbox(range_server):
+    url = "http://127.0.0.1:{}/tif/wf_100m_klas.tif".format(range_server.server_port)
+    result = geoextent.fromRemoteFile(url, bbox=True, tbox=False)
+    assert result["bbox"] == pytest.approx([5.765119, 50.310251, 9.468398, 52.531670], abs=tolerance)
+    assert result["crs"] == "4326"
+    assert range_server.bytes_sent < os.path.getsize("tests/testdata/tif/wf_100m_klas.tif") / 2
+
+
+def test_remote_reader_falls_back_to_download(range_server):
+    url = "http://127.0.0.1:{}".format(range_server.server_port)
+    filenames = ["tif/wf_100m_klas.tif", "geojson/muenster_ring_zeit.geojson"]
+    repository = _LocalProvider(url, filenames)
+    downloaded = []
+    with tempfile.TemporaryDirectory() as tmp:
+        metadata_directory = {}
+        repository.remote_reader = geoextent._remote_reader(tmp, True, False, metadata_directory)
+        repository.download(tmp, on_download=downloaded.extend)
+        assert os.listdir(tmp) == ["muenster_ring_zeit.geojson"]
+    assert [os.path.basename(filepath) for filepath in downloaded] == ["muenster_ring_zeit.geojson"]
+    assert list(metadata_directory) == ["wf_100m_klas.tif"]
+    assert metadata_directory["wf_100m_klas.tif"]["format"] == "tif"
+
+
+def test_download_store_resume_and_deduplicate(range_server):
+    filepath = "tests/testdata/tif/wf_100m_klas.tif"
+    with open(filepath, "rb") as f:
+        content = f.read()
+    checksum = "md5:" + hashlib.md5(content).hexdigest()
+    url = "http://127.0.0.1:{}/tif/wf_100m_klas.tif".format(range_server.server_port)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DownloadStore(os.path.join(tmp, "store"))
+        # an interrupted download of the first 100000 bytes
+        with open(store.partial_path(url), "wb") as f:
+            f.write(content[:100000])
+
+        repository = Zenodo.Zenodo()
+        repository.download_store = store
+        repository._download_files([(url, os.path.join(tmp, "record1", "wf_100m_klas.tif"), checksum)])
+        with open(os.path.join(tmp, "record1", "wf_100m_klas.tif"), "rb") as f:
+            assert f.read() == content
+        assert range_server.bytes_sent == len(content) - 100000
+        assert store.find(checksum) is not None
+        assert not os.path.exists(store.partial_path(url))
+
+        # the same file in another record is not downloaded again
+        repository._download_files([(url + "?record=2", os.path.join(tmp, "record2", "wf_100m_klas.tif"), checksum)])
+        assert os.path.getsize(os.path.join(tmp, "record2", "wf_100m_klas.tif")) == len(content)
+        assert range_server.bytes_sent == len(content) - 100000
+
+
+def test_download_store_checksum_mismatch(range_server):
+    url = "http://127.0.0.1:{}/geojson/onePoint.geojson".format(range_server.server_port)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DownloadStore(os.path.join(tmp, "store"))
+        repository = Zenodo.Zenodo()
+        repository.download_store = store
+        with pytest.raises(Exception, match="checksum"):
+            repository._download_files([(url, os.path.join(tmp, "onePoint.geojson"), "md5:" + "0" * 32)])
+        assert not os.path.exists(store.partial_path(url))
+        assert not os.path.exists(os.path.join(tmp, "onePoint.geojson"))
+
+
+def test_declared_extent():
+    extent = geoextent.hf.declared_extent(points=[(7.6, 51.9), (400, 10)], boxes=[[2.0, 41.3, 3.1, 42.0]],
+                                          periods=[("2018-11-14T10:00:00", None), ("2019-09-11", "no date")])
+    assert extent == {"bbox": [2.0, 41.3, 7.6, 51.9], "crs": "4326", "tbox": ["2018-11-14", "2019-09-11"]}
+    assert geoextent.hf.declared_extent(points=[], periods=[(None, None)]) is None
+
+
+def _zenodo_record(locations, dates, size):
+    repository = Zenodo.Zenodo()
+    repository.record = {"metadata": {"locations": locations, "dates": dates},
+                         "files": [{"size": size, "links": {"self": "https://zenodo.org/files/a.tif/content"}}]}
+    return repository
+
+
+def test_extent_from_zenodo_metadata():
+    repository = _zenodo_record([{"lat": 51.97, "lon": 7.65, "place": "Münster"}, {"lat": 41.3, "lon": 2.05}],
+                                [{"type": "Collected", "start": "2018-11-14", "end": "2019-09-11"}], 10)
+    result = geoextent._fromDeclaredExtent(repository, bbox=True, tbox=True, metadata_first=True)
+    assert result == {"extent_source": "metadata", "crs": "4326", "bbox": [2.05, 41.3, 7.65, 51.97],
+                      "tbox": ["2018-11-14", "2019-09-11"]}
+
+
+def test_extent_from_metadata_incomplete():
+    repository = _zenodo_record([{"lat": 51.97, "lon": 7.65}], [], 10 ** 9)
+    # without a declared time extent the files are downloaded
+    assert geoextent._fromDeclaredExtent(repository, bbox=True, tbox=True, metadata_first=True) is None
+    assert geoextent._fromDeclaredExtent(repository, bbox=True, tbox=True, metadata_only_above=10 ** 10) is None
+    # unless the record is too large
+    result = geoextent._fromDeclaredExtent(repository, bbox=True, tbox=True, metadata_only_above=10 ** 6)
+    assert result == {"extent_source": "metadata", "crs": "4326", "bbox": [7.65, 51.97, 7.65, 51.97]}
+
+
+def test_plan_downloads():
+    repository = Zenodo.Zenodo()
+    repository.skip_unsupported = True
+    repository.max_file_size = 1000
+    repository.max_record_size = 1500
+    files = [("https://example.org/paper.pdf", "paper.pdf", None, 10),
+             ("https://example.org/roads.shp", "roads.shp", None, 600),
+             ("https://example.org/roads.dbf", "roads.dbf", None, 300),
+             ("https://example.org/dem.tif", "dem.tif", None, 5000),
+             ("https://example.org/cities.csv", "cities.csv", None, 700),
+             ("https://example.org/points.geojson", "points.geojson", None, None)]
+    planned = repository._plan_downloads(files)
+    assert [filepath for _, filepath, _, _ in planned] == ["roads.shp", "roads.dbf", "points.geojson"]
+    assert repository.skipped_files == [
+        {"filename": "paper.pdf", "size": 10, "reason": "unsupported format"},
+        {"filename": "dem.tif", "size": 5000, "reason": "file larger than 1000 bytes"},
+        {"filename": "cities.csv", "size": 700, "reason": "record larger than 1500 bytes"}]
+
+
+def test_plan_downloads_gridded_formats():
+    repository = Zenodo.Zenodo()
+    repository.skip_unsupported = True
+    filenames = ["t2m.nc4", "swath.he5", "model.hdf5", "forecast.grib2", "store.zarr", "readme.txt"]
+    planned = repository._plan_downloads([("https://example.org/" + f, f, None, 10) for f in filenames])
+    assert [filepath for _, filepath, _, _ in planned] == filenames[:-1]
+
+
+def test_file_group():
+    group = Zenodo.Zenodo._file_group
+    assert group("data/roads.shp") == group("data/Roads.DBF") == group("data/roads.shp.xml") == ("data", "roads")
+    assert group("data/dem.tif") == group("data/dem.tfw") == group("data/dem.tif.aux.xml") == ("data", "dem")
+    # only companion files are grouped, other files of the same name are read on their own
+    assert group("data/cities.csv") != group("data/cities.geojson")
+    assert group("data/roads.2019.shp") == group("data/roads.2019.shx") != group("data/roads.2020.shp")
+    assert group("data/roads.shp") != group("other/roads.shx")
+
+
+def test_from_repositories(monkeypatch):
+    lock = threading.Lock()
+    active = {"now": 0, "max": 0}
+
+    def from_repository(self, repository_identifier, bbox=False, tbox=False, details=False, throttle=False,
+                        timeout=None, **options):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.1)
+        with lock:
+            active["now"] -= 1
+        if repository_identifier == "10.5281/zenodo.0":
+            raise Exception("The zenodo record does not exist")
+        if repository_identifier == "unknown":
+            return None
+        return {"bbox": [7.6, 51.9, 7.7, 52.0], "crs": "4326", "pipeline": options["pipeline"]}
+
+    monkeypatch.setattr(geoextent.geoextent_from_repository, "from_repository", from_repository)
+    identifiers = ["10.5281/zenodo.{}".format(i) for i in range(6)] + ["unknown"]
+    records = list(geoextent.from_repositories(identifiers, bbox=True, record_workers=3, pipeline=True))
+
+    assert sorted(record["identifier"] for record in records) == sorted(identifiers)
+    assert active["max"] == 3
+    results = {record["identifier"]: record for record in records}
+    assert results["10.5281/zenodo.0"]["metadata"] is None
+    assert "does not exist" in results["10.5281/zenodo.0"]["error"]
+    assert results["unknown"]["metadata"] is None
+    assert results["10.5281/zenodo.1"]["error"] is None
+    assert results["10.5281/zenodo.1"]["metadata"] == {"bbox": [7.6, 51.9, 7.7, 52.0], "crs": "4326",
+                                                        "pipeline": True, "format": "repository"}
+
+
+def test_from_repositories_bounded_window(monkeypatch):
+    def from_repository(self, repository_identifier, bbox=False, tbox=False, details=False, throttle=False,
+                        timeout=None, **options):
+        return {"bbox": [7.6, 51.9, 7.7, 52.0], "crs": "4326"}
+
+    monkeypatch.setattr(geoextent.geoextent_from_repository, "from_repository", from_repository)
+    consumed = []
+
+    def identifiers():
+        for i in range(1000):
+            consumed.append(i)
+            yield "10.5281/zenodo.{}".format(i)
+
+    yielded = 0
+    for record in geoextent.from_repositories(identifiers(), bbox=True, record_workers=2):
+        yielded += 1
+        assert len(consumed) - yielded <= geoextent.RECORDS_IN_FLIGHT_PER_WORKER * 2
+    assert yielded == 1000
+
+
+def test_sessions_shared_per_host():
+    application = geoextent.geoextent_from_repository()
+    application.record_workers = 2
+    session = application._session("Zenodo")
+    assert application._session("Zenodo") is session
+    assert application._session("Dryad") is not session
+    assert session.get_adapter("https://zenodo.org")._pool_maxsize == 2 * application.download_workers
+
+
+def test_rate_limiter_learns_from_headers():
+    limiter = providers.RateLimiter(burst=2)
+    limiter.update(_Response("https://zenodo.org", headers={"x-ratelimit-remaining": "2",
+                                                            "x-ratelimit-reset": str(time.time() + 10)}))
+    assert limiter.rate == pytest.approx(0.2, rel=0.1)
+
+    limiter.update(_Response("https://datadryad.org", headers={"ratelimit-remaining": "0", "ratelimit-reset": "2"}))
+    assert limiter.blocked_until > time.monotonic() + 1
+
+
+def test_rate_limiter_shared_per_host():
+    limiter = providers.rate_limiter("https://zenodo.org/api/records/820562")
+    assert providers.rate_limiter("https://zenodo.org/records/820562/files/a.tif") is limiter
+    assert providers.rate_limiter("https://datadryad.org/api/v2/datasets") is not limiter
+
+
+def test_rate_limiter_spreads_requests():
+    limiter = providers.RateLimiter(burst=1)
+    limiter.update(_Response("https://zenodo.org", headers={"x-ratelimit-remaining": "10",
+                                                            "x-ratelimit-reset": "1"}))
+    start = time.monotonic()
+    threads = [threading.Thread(target=limiter.acquire) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # one request at once, then one every 0.1 s
+    assert time.monotonic() - start == pytest.approx(0.3, abs=0.15)
+
+
+def test_rate_limiter_waits_after_429():
+    limiter = providers.RateLimiter()
+    limiter.update(_Response("https://zenodo.org", status_code=429, headers={"retry-after": "1"}))
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.9
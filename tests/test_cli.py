@@ -1,3 +1,4 @@
+import json
 import os  # used to get the location of the testdata
 from osgeo import ogr
 import sys
@@ -200,7 +201,7 @@ def test_geotiff_bbox(script_runner):
     assert ret.stderr == '', "stderr should be empty"
     result = ret.stdout
     bboxList = parse_coordinates(result)
-    assert bboxList == pytest.approx([5.915300, 50.310251, 9.468398, 52.530775], abs=tolerance)
+    assert bboxList == pytest.approx([5.765119, 50.310251, 9.468398, 52.531670], abs=tolerance)
     assert "4326" in result
 
 
@@ -263,6 +264,25 @@ def test_gml_time(script_runner):
     assert "['2005-12-31', '2013-11-30']" in ret.stdout, "time value is printed to console"
 
 
+def test_folder_workers(script_runner):
+    ret = script_runner.run('geoextent', '-b', '-t', '--workers', '2', 'tests/testdata/folders/folder_two_files')
+    assert ret.success, "process should return success"
+    result = ret.stdout
+    bboxList = parse_coordinates(result)
+    assert bboxList == pytest.approx([2.052333, 41.317038, 7.647256, 51.974624], abs=tolerance)
+    assert "['2018-11-14', '2019-09-11']" in result
+
+
+def test_folder_stream(script_runner):
+    ret = script_runner.run('geoextent', '-b', '-t', '--stream', 'tests/testdata/folders/folder_two_files')
+    assert ret.success, "process should return success"
+    records = [json.loads(line) for line in ret.stdout.splitlines()]
+    assert len(records) == len(os.listdir('tests/testdata/folders/folder_two_files'))
+    merged = records[-1]["merged"]
+    assert merged["bbox"] == pytest.approx([2.052333, 41.317038, 7.647256, 51.974624], abs=tolerance)
+    assert merged["tbox"] == ['2018-11-14', '2019-09-11']
+
+
 @pytest.mark.skip(reason="multiple input directories not implemented yet")
 def test_gml_only_one_time_feature_valid(script_runner):
     ret = script_runner.run('geoextent', '-t', 'tests/testdata/gml/mypolygon_px6_error_time_one_feature.gml')